@@ -1,47 +1,77 @@
 from fastapi import APIRouter, Depends, Response
-from server.db.models import Customer, Restaurant
-from server.utils.auth import authenticate_user
-from sqlmodel import Session
+from server.utils.auth import authenticate_principal, model_map, options_map, schema_map
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from server.db.schemas import UserCreate, UserType, UserWithToken, SigninData, CustomerPublic, RestaurantWithDetail, RestaurantPublic
+from server.db.schemas import UserCreate, UserType, UserWithToken, SigninData, CustomerPublic, RestaurantWithDetail, RestaurantPublic, Principal
 from server.db.session import get_session
+from server.services.admission import auth_ip_limiter, limit_by_ip, signin_account_limiter
 from server.services.auth import signin_user, signup_user
 from server.utils.cookies import set_auth_cookie, delete_auth_cookie
+from server.utils.exceptions import invalid_credentials
+from server.utils.fields import FIELDS_QUERY, Projection
+from server.utils.responses import model_response
 
 
 router = APIRouter(prefix="/auth")
 
+# Sign-up and sign-in answer with the public profile of either role
+public_schema_map = {
+    UserType.customer: CustomerPublic,
+    UserType.restaurant: RestaurantPublic,
+}
 
-@router.post("/signup/{user_role}", response_model=CustomerPublic | RestaurantPublic)
-def signup(user_role: UserType, data: UserCreate, response: Response, session: Session = Depends(get_session)):
+
+@router.post("/signup/{user_role}", response_model=CustomerPublic | RestaurantPublic,
+             dependencies=[limit_by_ip(auth_ip_limiter)])
+async def signup(user_role: UserType, data: UserCreate, response: Response, session: AsyncSession = Depends(get_session)):
     """
     Signs up a new user and sets an HttpOnly auth cookie.
     The access token is NOT returned in the response body.
     """
-    result = signup_user(data=data, user_role=user_role, session=session)
+    result = await signup_user(data=data, user_role=user_role, session=session)
     set_auth_cookie(response, result["access_token"])
-    return result["user"]
+    # Already validated by the service, so skip the union response model
+    return model_response(result["user"], response, public_schema_map[user_role])
 
 
-@router.post("/signin/{user_role}", response_model=CustomerPublic | RestaurantPublic)
-def signin(user_role: UserType, data: SigninData, response: Response, session: Session = Depends(get_session)):
+@router.post("/signin/{user_role}", response_model=CustomerPublic | RestaurantPublic,
+             dependencies=[limit_by_ip(auth_ip_limiter)])
+async def signin(user_role: UserType, data: SigninData, response: Response, session: AsyncSession = Depends(get_session)):
     """
     Signs in an existing user and sets an HttpOnly auth cookie.
     The access token is NOT returned in the response body.
     """
-    result = signin_user(data=data, user_role=user_role, session=session)
+    # Per account as well, so guessing one password from many addresses is just as slow
+    signin_account_limiter.check((user_role, data.email.lower()))
+    result = await signin_user(data=data, user_role=user_role, session=session)
     set_auth_cookie(response, result["access_token"])
-    return result["user"]
+    return model_response(result["user"], response, public_schema_map[user_role])
 
 
 @router.post("/signout")
-def signout(response: Response):
+async def signout(response: Response):
     """Signs out the current user by deleting the auth cookie."""
     delete_auth_cookie(response)
     return {"message": "Successfully signed out"}
 
 
 @router.get("/me", response_model=CustomerPublic | RestaurantWithDetail)
-async def get_current_user(current_user: Customer | Restaurant = Depends(authenticate_user)):
-    """Get the current authenticated user's information."""
-    return current_user
+async def get_current_user(
+    fields: str | None = FIELDS_QUERY,
+    current: Principal = Depends(authenticate_principal),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Get the current authenticated user's information.
+    Pass `fields` to receive only part of it; e.g. `fields=id,username` is
+    answered from the verified token without touching the database.
+    """
+    projection = Projection(schema_map[current.role], fields)
+    if projection.covered_by(Principal):
+        return projection.response(current)
+
+    options = projection.options(model_map[current.role], options_map[current.role])
+    user = await session.get(model_map[current.role], current.id, options=options)
+    if user is None:
+        raise invalid_credentials
+    return projection.response(user)
@@ -1,74 +1,197 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import Session, select
+from fastapi import APIRouter, Depends, Query, Request, Response
+from sqlalchemy import ColumnElement, Select, and_, delete, insert, literal
+from sqlmodel import func, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from uuid import UUID
-from server.db.models import Customer, CustomerRestaurantLink, Restaurant
+from server.config import MAX_PAGE_SIZE
+from server.db.loaders import customer_public_options
+from server.db.models import Customer, CustomerRestaurantLink, Order, Restaurant
 from server.db.schemas import (
-    CustomerPublic, LikedRestaurantUpdate,
+    CustomerPublic, LikedRestaurantStatus, LikedRestaurantsSync, LikedRestaurantUpdate,
+    Principal, UserType, QUEUED_ORDER_STATUSES,
 )
 from server.db.session import get_session
-from server.utils.auth import authenticate_user
-from server.utils.exceptions import user_not_found
+from server.services.events import customer_topic, order_events
+from server.utils.auth import authenticate_principal, authenticate_user
+from server.utils.etag import bump_customer, make_etag, not_modified
+from server.utils.exceptions import restaurant_not_found, unauthorized, user_not_found
+from server.utils.fields import FIELDS_QUERY, Projection
+from server.utils.pagination import keyset, next_cursor, stream_json_array
+from server.utils.sse import event_stream_response
 
 router = APIRouter(prefix="/customers")
 
 
-@router.patch("/me/liked-restaurants", response_model=CustomerPublic)
-def toggle_like_restaurant(
+def _liked_by(customer_id: UUID, restaurant_ids) -> ColumnElement[bool]:
+    """Rows of the link table for these restaurants, found through its primary key."""
+    return and_(CustomerRestaurantLink.customer_id == customer_id,
+                CustomerRestaurantLink.restaurant_id.in_(restaurant_ids))
+
+
+def _like(customer_id: UUID, restaurants: Select):
+    """Links the customer to every restaurant the query selects, unless already linked."""
+    customer = literal(customer_id, CustomerRestaurantLink.__table__.c.customer_id.type)
+    already = select(CustomerRestaurantLink).where(
+        CustomerRestaurantLink.customer_id == customer_id,
+        CustomerRestaurantLink.restaurant_id == Restaurant.id,
+    )
+    return insert(CustomerRestaurantLink).from_select(
+        ["customer_id", "restaurant_id"],
+        restaurants.with_only_columns(customer, Restaurant.id).where(~already.exists()),
+    )
+
+
+@router.patch("/me/liked-restaurants", response_model=LikedRestaurantStatus)
+async def toggle_like_restaurant(
     update_data: LikedRestaurantUpdate,
-    current_customer: Customer = Depends(authenticate_user),
-    session: Session = Depends(get_session),
+    current: Principal = Depends(authenticate_principal),
+    session: AsyncSession = Depends(get_session),
 ):
     """
     Toggles the liked status of a restaurant for the current customer.
     If the restaurant is already liked, it will be unliked.
     If it's not liked, it will be added to the liked list.
+    Only the new state is returned; `/customers/me` has the full profile.
+    """
+    if current.role != UserType.customer:
+        raise unauthorized
+
+    restaurant_id = update_data.restaurant_id
+    unliked = (await session.exec(
+        delete(CustomerRestaurantLink).where(_liked_by(current.id, [restaurant_id])))).rowcount
+    if not unliked:
+        # Inserts nothing when there is no such restaurant
+        liked = (await session.exec(
+            _like(current.id, select(Restaurant).where(Restaurant.id == restaurant_id)))).rowcount
+        if not liked:
+            raise restaurant_not_found
+
+    await bump_customer(session, current.id)
+    await session.commit()
+    return LikedRestaurantStatus(restaurant_id=restaurant_id, liked=not unliked)
+
+
+@router.post("/me/liked-restaurants/batch", response_model=list[LikedRestaurantStatus])
+async def sync_liked_restaurants(
+    data: LikedRestaurantsSync,
+    current: Principal = Depends(authenticate_principal),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Applies a batch of likes and unlikes in one transaction, e.g. the toggles
+    a client made while offline. Each change sets the desired state, so
+    replaying a batch is harmless. If any liked restaurant does not exist,
+    nothing is changed.
     """
-    restaurant = session.get(Restaurant, update_data.restaurant_id)
-    if not restaurant:
-        raise HTTPException(status_code=404, detail="Restaurant not found")
+    if current.role != UserType.customer:
+        raise unauthorized
 
-    # Check if the restaurant is already in the liked list
-    if restaurant in current_customer.liked_restaurants:
-        current_customer.liked_restaurants.remove(restaurant)
-    else:
-        current_customer.liked_restaurants.append(restaurant)
+    # Later changes to the same restaurant override earlier ones
+    wanted = {change.restaurant_id: change.liked for change in data.changes}
+    likes = [rid for rid, liked in wanted.items() if liked]
+    unlikes = [rid for rid, liked in wanted.items() if not liked]
 
-    session.add(current_customer)
-    session.commit()
-    session.refresh(current_customer)
+    changed = 0
+    if likes:
+        restaurants = select(Restaurant).where(Restaurant.id.in_(likes))
+        found = (await session.exec(
+            restaurants.with_only_columns(func.count(Restaurant.id)))).one()
+        if found != len(likes):
+            raise restaurant_not_found
+        changed += (await session.exec(_like(current.id, restaurants))).rowcount
+    if unlikes:
+        changed += (await session.exec(
+            delete(CustomerRestaurantLink).where(_liked_by(current.id, unlikes)))).rowcount
 
-    return current_customer
+    if changed:
+        await bump_customer(session, current.id)
+        await session.commit()
+    return [LikedRestaurantStatus(restaurant_id=rid, liked=liked) for rid, liked in wanted.items()]
 
 
 @router.get(
     "/me",
     response_model=CustomerPublic
 )
-def read_own_profile(
+async def read_own_profile(
+    request: Request,
+    response: Response,
+    fields: str | None = FIELDS_QUERY,
     current: Customer = Depends(authenticate_user),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_session)
 ):
-    """Fetches the profile of the currently authenticated customer."""
-    session.refresh(current)
-    return current
+    """
+    Fetches the profile of the currently authenticated customer.
+    Pass `fields` to load and return only part of it, e.g. `fields=id,orders.status`.
+    """
+    projection = Projection(CustomerPublic, fields)
+    # The profile embeds the menus of liked restaurants, so their public changes count too
+    liked_update = (
+        select(func.max(Restaurant.updated_at))
+        .join(CustomerRestaurantLink, CustomerRestaurantLink.restaurant_id == Restaurant.id)
+        .where(CustomerRestaurantLink.customer_id == current.id)
+    )
+    # The wait estimates of queued orders move whenever their restaurant's queue does
+    queue_update = (
+        select(func.max(Restaurant.queue_updated_at))
+        .join(Order, Order.restaurant_id == Restaurant.id)
+        .where(Order.customer_id == current.id, Order.status.in_(QUEUED_ORDER_STATUSES))
+    )
+    markers = (await session.exec(
+        select(liked_update.scalar_subquery(), queue_update.scalar_subquery()))).one()
+    etag = make_etag("customer", current.id, current.version, projection.key, *markers)
+    if cached := not_modified(request, response, etag):
+        return cached
+
+    customer = await projection.load(session, current, customer_public_options)
+    return projection.response(customer, response)
+
+
+@router.get("/me/orders/stream")
+async def stream_own_orders(
+    request: Request,
+    current: Principal = Depends(authenticate_principal),
+):
+    """Streams status changes of all orders of the current customer as Server-Sent Events."""
+    if current.role != UserType.customer:
+        raise unauthorized
+    subscription = order_events.subscribe(customer_topic(current.id))
+    return event_stream_response(request, subscription)
 
 
 @router.get("/{customer_id}", response_model=CustomerPublic)
-def get_customer_details(
+async def get_customer_details(
     customer_id: UUID,
+    fields: str | None = FIELDS_QUERY,
     # This ensures only authenticated restaurants can access this endpoint
-    current_restaurant: Restaurant = Depends(authenticate_user),
-    session: Session = Depends(get_session)
+    current_restaurant: Principal = Depends(authenticate_principal),
+    session: AsyncSession = Depends(get_session)
 ):
-    """Fetches the details of a specific customer by their ID."""
-    customer = session.get(Customer, customer_id)
+    """Fetches the details of a specific customer by their ID; supports `fields` like `/me`."""
+    projection = Projection(CustomerPublic, fields)
+    customer = await session.get(Customer, customer_id,
+                                 options=projection.options(Customer, customer_public_options))
     if not customer:
         raise user_not_found
-    return customer
+    return projection.response(customer)
 
 
 @router.get("/", response_model=list[CustomerPublic])
-def get_all_customers(session: Session = Depends(get_session)):
-    """Retrieves a list of all customers. Note: No authentication required."""
-    customers = session.exec(select(Customer)).all()
-    return customers
+async def get_all_customers(
+    response: Response,
+    cursor: str | None = None,
+    limit: int | None = Query(default=None, ge=1, le=MAX_PAGE_SIZE),
+    stream: bool = False,
+    session: AsyncSession = Depends(get_session)
+):
+    """
+    Retrieves a list of all customers. Note: No authentication required.
+    Supports the same `cursor`, `limit` and `stream` parameters as `/restaurants/`.
+    """
+    query = select(Customer).options(*customer_public_options)
+    if stream:
+        query = keyset(query, Customer, cursor, None)
+        return stream_json_array(query.limit(limit) if limit else query, CustomerPublic)
+
+    customers = (await session.exec(keyset(query, Customer, cursor, limit))).all()
+    return next_cursor(customers, limit, response)
@@ -0,0 +1,34 @@
+from fastapi import APIRouter, Depends, Query
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from server.config import DATABASE_URL, MAX_PAGE_SIZE
+from server.db.schemas import FoodSearchResult
+from server.db.session import get_session
+from server.services.search import fts_search, like_search, search_terms
+
+router = APIRouter(prefix="/foods")
+
+# The full-text index only exists on SQLite
+search = fts_search if DATABASE_URL.startswith("sqlite") else like_search
+
+
+@router.get("/search", response_model=list[FoodSearchResult])
+async def search_foods(
+    q: str = Query(min_length=1, max_length=100),
+    min_price: float | None = Query(default=None, ge=0),
+    max_price: float | None = Query(default=None, ge=0),
+    limit: int = Query(default=20, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(default=0, ge=0),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Searches the menus of every restaurant, best match first.
+    Each word of `q` matches the start of a word in the food's title or its
+    restaurant's name, so "veggie wr" finds "Veggie wrap". Matches in the
+    title rank higher. Page with `limit` and `offset`.
+    """
+    terms = search_terms(q)
+    if not terms:
+        return []
+    query = search(terms, min_price, max_price).limit(limit).offset(offset)
+    return (await session.exec(query)).all()
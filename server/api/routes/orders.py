@@ -1,37 +1,48 @@
-from fastapi import APIRouter, Depends
-from sqlmodel import Session
+from fastapi import APIRouter, Depends, Query, Request, Response
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from uuid import UUID
+from datetime import datetime
 
-from server.db.schemas import OrderCreate, OrderPublic, OrderUpdate
-from server.db.models import Customer, Order, Restaurant
-from server.utils.exceptions import order_not_found, unauthorized
-from server.utils.auth import authenticate_user
+from server.db.loaders import archived_order_options, order_public_options
+from server.db.schemas import (
+    CartLine, OrderBatchCreate, OrderCreate, OrderPublic, OrderUpdate, Principal, UserType,
+)
+from server.config import MAX_PAGE_SIZE
+from server.db.models import ArchivedOrder, Food, Order, Restaurant
+from server.utils.exceptions import food_not_on_menu, order_not_found, unauthorized
+from server.utils.auth import authenticate_principal
 from server.db.session import get_session
+from server.services.admission import (
+    kitchen_loads, limit_by_ip, limit_by_user, order_ip_limiter, order_user_limiter,
+)
+from server.services.analytics import record_orders_placed, record_status_change
+from server.services.events import order_events, order_topic
+from server.services.wait_times import order_status_changed, queue_orders
+from server.services.write_pipeline import run_write
+from server.utils.etag import bump_customer, make_etag, not_modified
+from server.utils.pagination import keyset, next_cursor
+from server.utils.sse import event_stream_response
 
 
 router = APIRouter(prefix="/orders")
 
 
-@router.get(
-    "/{order_id}",
-    response_model=OrderPublic
-)
-def get_order(
-    order_id: UUID,
-    current: Customer | Restaurant = Depends(authenticate_user),
-    session: Session = Depends(get_session)
-):
-    order = session.get(Order, order_id)
+async def get_visible_order(order_id: UUID, current: Principal, session: AsyncSession) -> Order | ArchivedOrder:
+    """
+    Returns the order if it exists and belongs to the current customer or restaurant.
+    Orders that have been archived are still found.
+    """
+    order = (await session.get(Order, order_id, options=order_public_options)
+             or await session.get(ArchivedOrder, order_id, options=archived_order_options))
 
     # Validate that the order exists
     if not order:
         raise order_not_found
 
     # Check if the current user is authorized to view the order
-    is_customer = isinstance(
-        current, Customer) and current.id == order.customer_id
-    is_restaurant = isinstance(
-        current, Restaurant) and current.id == order.restaurant_id
+    is_customer = current.role == UserType.customer and current.id == order.customer_id
+    is_restaurant = current.role == UserType.restaurant and current.id == order.restaurant_id
 
     if not (is_customer or is_restaurant):
         raise unauthorized
@@ -39,52 +50,214 @@ def get_order(
     return order
 
 
+@router.get(
+    "/history",
+    response_model=list[OrderPublic]
+)
+async def read_order_history(
+    response: Response,
+    cursor: str | None = None,
+    limit: int = Query(default=20, ge=1, le=MAX_PAGE_SIZE),
+    current: Principal = Depends(authenticate_principal),
+    session: AsyncSession = Depends(get_session)
+):
+    """
+    Pages through every order of the current customer or restaurant, newest first,
+    archived ones included. The cursor of the next page is returned in the
+    `X-Next-Cursor` header.
+    """
+    owner = "customer_id" if current.role == UserType.customer else "restaurant_id"
+
+    # A page of the union is always within the first `limit + 1` rows of each table
+    orders = []
+    for model, options in ((Order, order_public_options), (ArchivedOrder, archived_order_options)):
+        query = select(model).where(getattr(model, owner) == current.id).options(*options)
+        orders.extend((await session.exec(
+            keyset(query, model, cursor, limit, newest_first=True))).all())
+
+    orders.sort(key=lambda order: (order.created_at, order.id), reverse=True)
+    return next_cursor(orders[:limit + 1], limit, response)
+
+
+@router.get(
+    "/{order_id}",
+    response_model=OrderPublic
+)
+async def get_order(
+    order_id: UUID,
+    request: Request,
+    response: Response,
+    current: Principal = Depends(authenticate_principal),
+    session: AsyncSession = Depends(get_session)
+):
+    order = await get_visible_order(order_id, current, session)
+
+    # The estimates move with the restaurant's queue, not only with the order itself
+    etag = make_etag("order", order.id, order.updated_at,
+                     order.queue_position, order.estimated_ready_at)
+    if cached := not_modified(request, response, etag):
+        return cached
+
+    return order
+
+
+@router.get("/{order_id}/stream")
+async def stream_order(
+    order_id: UUID,
+    request: Request,
+    current: Principal = Depends(authenticate_principal),
+    session: AsyncSession = Depends(get_session)
+):
+    """
+    Streams status changes of a single order as Server-Sent Events.
+    Authentication happens once when the stream is opened; the current
+    state of the order is sent as the first event.
+    """
+    # Subscribe before reading the order so no change can slip in between
+    subscription = order_events.subscribe(order_topic(order_id))
+    try:
+        order = await get_visible_order(order_id, current, session)
+    except Exception:
+        order_events.unsubscribe(subscription)
+        raise
+
+    snapshot = OrderPublic.model_validate(order).model_dump_json()
+    return event_stream_response(request, subscription, initial=[snapshot])
+
+
+async def place_orders(
+    session: AsyncSession,
+    current: Principal,
+    customer_id: UUID,
+    restaurant_id: UUID,
+    lines: list[CartLine],
+) -> list[Order]:
+    """
+    Validates a cart and stores one order per line in a single transaction.
+    All foods are checked against the restaurant's menu with one query.
+    """
+    # Customers can only order for themselves
+    if current.role != UserType.customer or current.id != customer_id:
+        raise unauthorized
+    # A kitchen known to be full turns the cart away before any query
+    kitchen_loads.check(restaurant_id, len(lines))
+
+    async def insert_orders(session: AsyncSession) -> list[Order]:
+        food_ids = {line.food_id for line in lines}
+        foods = (await session.exec(
+            select(Food).where(Food.restaurant_id == restaurant_id, Food.id.in_(food_ids),
+                              Food.removed_at.is_(None))
+        )).all()
+        menu = {food.id: food for food in foods}
+        if len(menu) != len(food_ids):
+            raise food_not_on_menu
+
+        # Tickets are handed out before the orders are added, so they are inserted with them
+        restaurant = await session.get(Restaurant, restaurant_id)
+        kitchen_loads.admit(restaurant, len(lines))
+        first_ticket = await queue_orders(session, restaurant, len(lines))
+        kitchen_loads.remember(restaurant)
+
+        orders = [
+            Order(
+                customer_id=customer_id,
+                restaurant_id=restaurant_id,
+                food_id=line.food_id,
+                quantity=line.quantity,
+                queue_ticket=ticket,
+                # Already loaded, so the response needs no further query
+                food=menu[line.food_id],
+                restaurant=restaurant,
+            )
+            for ticket, line in enumerate(lines, start=first_ticket)
+        ]
+        # Flushed together, as one multi-row insert
+        session.add_all(orders)
+        await record_orders_placed(session, orders, menu)
+        await bump_customer(session, customer_id)
+        return orders
+
+    orders = await run_write(session, insert_orders)
+
+    for order in orders:
+        order_events.publish(OrderPublic.model_validate(order))
+    return orders
+
+
 @router.post(
     "/new-order",
     status_code=201,
+    dependencies=[limit_by_ip(order_ip_limiter), limit_by_user(order_user_limiter)],
     response_model=OrderPublic
 )
-def create_order(
+async def create_order(
     data: OrderCreate,
-    current: Customer = Depends(authenticate_user),
-    session: Session = Depends(get_session)
+    current: Principal = Depends(authenticate_principal),
+    session: AsyncSession = Depends(get_session)
 ):
-    order = Order(**data.model_dump())
-    session.add(order)
-    session.commit()
-    session.refresh(order)
-    return order
+    line = CartLine(food_id=data.food_id, quantity=data.quantity)
+    orders = await place_orders(session, current, data.customer_id, data.restaurant_id, [line])
+    return orders[0]
+
+
+@router.post(
+    "/batch",
+    status_code=201,
+    dependencies=[limit_by_ip(order_ip_limiter), limit_by_user(order_user_limiter)],
+    response_model=list[OrderPublic]
+)
+async def create_orders(
+    data: OrderBatchCreate,
+    current: Principal = Depends(authenticate_principal),
+    session: AsyncSession = Depends(get_session)
+):
+    """
+    Checks out a whole cart in one request.
+    Either every line becomes an order or, if any food is not on the
+    restaurant's menu, none of them does.
+    """
+    return await place_orders(session, current, data.customer_id, data.restaurant_id, data.lines)
 
 
 @router.patch(
     "/{order_id}/status",
     response_model=OrderPublic
 )
-def update_order_status(
+async def update_order_status(
     order_id: UUID,
     data: OrderUpdate,
-    current: Restaurant = Depends(authenticate_user),
-    session: Session = Depends(get_session)
+    current: Principal = Depends(authenticate_principal),
+    session: AsyncSession = Depends(get_session)
 ):
-    # Fetch the order by ID
-    order = session.get(Order, order_id)
+    async def change_status(session: AsyncSession) -> Order:
+        # Fetch the order by ID
+        order = await session.get(Order, order_id, options=order_public_options)
 
-    # If the order does not exist or does not belong to the current restaurant,
-    # raise an error. This also prevents customers from accessing this route,
-    # since their id's will not match
-    if not order or order.restaurant_id != current.id:
-        raise order_not_found
+        # If the order does not exist or does not belong to the current restaurant,
+        # raise an error. This also prevents customers from accessing this route,
+        # since their id's will not match
+        if not order or order.restaurant_id != current.id:
+            raise order_not_found
 
-    # Extract only the fields provided in the request body (exclude unset fields)
-    upd = data.model_dump(exclude_unset=True)
+        # Extract only the fields provided in the request body (exclude unset fields)
+        upd = data.model_dump(exclude_unset=True)
+        previous = order.status
 
-    # Update the order object with new values
-    for k, v in upd.items():
-        setattr(order, k, v)
+        # Update the order object with new values
+        for k, v in upd.items():
+            setattr(order, k, v)
+        order.updated_at = datetime.now()
+        await order_status_changed(session, order, previous)
+        kitchen_loads.remember(order.restaurant)
+        await record_status_change(session, order, previous)
+        await bump_customer(session, order.customer_id)
+        return order
 
     # Save changes to the database
-    session.commit()
-    session.refresh(order)
+    order = await run_write(session, change_status)
+
+    # Notify everyone streaming this order
+    order_events.publish(OrderPublic.model_validate(order))
 
     # Return updated order
     return order
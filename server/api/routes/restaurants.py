@@ -1,56 +1,218 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import select, Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlmodel import func, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from datetime import datetime, timedelta
 from typing import List
 from uuid import UUID
-from server.db.models import Food, Restaurant
+from server.db.loaders import (
+    order_public_options, reload, restaurant_detail_options, restaurant_public_options,
+)
+from server.db.models import Food, Order, Restaurant
 from server.db.schemas import (
-    RestaurantPublic, FoodPublic,
-    FoodCreate, RestaurantUpdate, RestaurantWithDetail,
+    RestaurantPublic, FoodPublic, OrderStatus, Principal, RestaurantOrders, UserType,
+    FoodCreate, FoodUpdate, MenuImportReport, RestaurantAnalytics, RestaurantUpdate, RestaurantWithDetail,
+    ACTIVE_ORDER_STATUSES,
 )
+from server.config import ANALYTICS_DEFAULT_DAYS, MAX_PAGE_SIZE
+from server.db.session import open_session
+from server.services.analytics import as_local, sales_report
+from server.services.catalog import CachedJSON, catalog_cache, restaurant_list_adapter
+from server.services.events import order_events, restaurant_topic
+from server.services.menu_import import MenuImport, current_menu
 from server.utils.auth import (
     get_session,
+    authenticate_principal,
     authenticate_user,
+    principal_cache,
 )
+from server.utils.etag import bump_restaurant, make_etag, not_modified
+from server.utils.exceptions import food_not_found, unauthorized, validation_error
+from server.utils.fields import FIELDS_QUERY, Projection
+from server.utils.pagination import NEXT_CURSOR_HEADER, keyset, next_cursor, stream_json_array
+from server.utils.sse import event_stream_response
 
 router = APIRouter(prefix="/restaurants")
 
 
 @router.get("/", response_model=List[RestaurantPublic])
-def list_restaurants(session: Session = Depends(get_session)):
-    """Retrieves a list of all restaurants available."""
-    return session.exec(select(Restaurant)).all()
+async def list_restaurants(
+    request: Request,
+    response: Response,
+    cursor: str | None = None,
+    limit: int | None = Query(default=None, ge=1, le=MAX_PAGE_SIZE),
+    stream: bool = False,
+):
+    """
+    Retrieves a list of all restaurants available, oldest first.
+    Pass `limit` to page through them; the cursor of the next page is returned
+    in the `X-Next-Cursor` header. Pass `stream=true` to receive the array
+    as it is read from the database.
+    Pages are served from the catalog cache; streamed responses never are.
+    """
+    key = (cursor, limit)
+    if not stream and (entry := catalog_cache.get_list(key)):
+        return entry.to_response(request)
+
+    generation = catalog_cache.generation
+    async with open_session(read_only=True) as session:
+        # Any signup or public change moves either the count or the latest update time
+        count, last_update = (await session.exec(
+            select(func.count(Restaurant.id), func.max(Restaurant.updated_at)))).one()
+        etag = make_etag("restaurants", count, last_update, cursor, limit, stream)
+
+        query = keyset(select(Restaurant).options(*restaurant_public_options),
+                       Restaurant, cursor, None if stream else limit)
+        if stream:
+            if cached := not_modified(request, response, etag):
+                return cached
+            return stream_json_array(query.limit(limit) if limit else query, RestaurantPublic,
+                                     headers={"ETag": etag})
+
+        restaurants = next_cursor((await session.exec(query)).all(), limit, response)
+        body = restaurant_list_adapter.dump_json(
+            restaurant_list_adapter.validate_python(restaurants, from_attributes=True))
+
+    headers = {}
+    if NEXT_CURSOR_HEADER in response.headers:
+        headers[NEXT_CURSOR_HEADER] = response.headers[NEXT_CURSOR_HEADER]
+    entry = CachedJSON(body, etag, headers)
+    catalog_cache.set_list(key, entry, generation)
+    return entry.to_response(request)
 
 
 @router.get(
     "/me",
     response_model=RestaurantWithDetail
 )
-def read_own_restaurant(
+async def read_own_restaurant(
+    request: Request,
+    response: Response,
+    fields: str | None = FIELDS_QUERY,
     current: Restaurant = Depends(authenticate_user),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_session)
 ):
-    """Fetches the detailed profile of the currently authenticated restaurant."""
-    session.refresh(current)
-    return current
+    """
+    Fetches the detailed profile of the currently authenticated restaurant.
+    Pass `fields` to load and return only part of it, e.g. `fields=restaurant_name,menu`.
+    """
+    projection = Projection(RestaurantWithDetail, fields)
+    # `current` was just loaded by authentication, so the check costs no extra query
+    etag = make_etag("restaurant-detail", current.id, current.version, projection.key)
+    if cached := not_modified(request, response, etag):
+        return cached
+
+    restaurant = await projection.load(session, current, restaurant_detail_options)
+    return projection.response(restaurant, response)
+
+
+# Writes that were still in flight when the previous poll ran may carry an
+# `updated_at` slightly older than the cursor, so re-read a small window.
+# Clients replace orders by id, which makes the overlap harmless.
+ORDER_CURSOR_OVERLAP = timedelta(seconds=1)
+
+
+@router.get(
+    "/me/orders",
+    response_model=RestaurantOrders
+)
+async def read_own_orders(
+    status: list[OrderStatus] = Query(default=ACTIVE_ORDER_STATUSES),
+    since: datetime | None = None,
+    current: Principal = Depends(authenticate_principal),
+    session: AsyncSession = Depends(get_session)
+):
+    """
+    Fetches the orders of the currently authenticated restaurant, newest first.
+    Without `since`, only orders in the given statuses (active ones by default) are returned.
+    With `since`, every order changed after the cursor is returned regardless of status,
+    so the client can also drop orders that left the active set.
+    """
+    cursor = datetime.now()
+
+    query = (
+        select(Order)
+        .where(Order.restaurant_id == current.id)
+        .options(*order_public_options)
+        .order_by(Order.created_at.desc())
+    )
+    if since is None:
+        query = query.where(Order.status.in_(status))
+    else:
+        query = query.where(Order.updated_at > since - ORDER_CURSOR_OVERLAP)
+
+    orders = (await session.exec(query)).all()
+    return RestaurantOrders(orders=orders, cursor=cursor)
+
+
+@router.get("/me/orders/stream")
+async def stream_own_orders(
+    request: Request,
+    current: Principal = Depends(authenticate_principal),
+):
+    """
+    Streams new orders and status changes of the current restaurant as Server-Sent Events.
+    Pair it with `/me/orders` to load the initial list.
+    """
+    if current.role != UserType.restaurant:
+        raise unauthorized
+    subscription = order_events.subscribe(restaurant_topic(current.id))
+    return event_stream_response(request, subscription)
+
+
+@router.get("/me/analytics", response_model=RestaurantAnalytics)
+async def read_own_analytics(
+    start: datetime | None = None,
+    end: datetime | None = None,
+    current: Principal = Depends(authenticate_principal),
+    session: AsyncSession = Depends(get_session)
+):
+    """
+    Sales of the current restaurant from `start` up to `end`, the last week by default:
+    totals, figures per hour and the best-selling foods.
+    Answered from hourly rollups, so ranges are widened to whole hours and
+    orders count towards the hour they were placed in.
+    """
+    if current.role != UserType.restaurant:
+        raise unauthorized
+    end = as_local(end) if end else datetime.now()
+    start = as_local(start) if start else end - timedelta(days=ANALYTICS_DEFAULT_DAYS)
+    if start >= end:
+        raise validation_error
+    return await sales_report(session, current.id, start, end)
 
 
 @router.get("/{restaurant_id}", response_model=RestaurantPublic)
-def get_restaurant_details(restaurant_id: UUID, session: Session = Depends(get_session)):
+async def get_restaurant_details(
+    restaurant_id: UUID,
+    request: Request,
+):
     """Fetches the public details of a specific restaurant by its ID."""
-    restaurant = session.get(Restaurant, restaurant_id)
-    if not restaurant:
-        raise HTTPException(status_code=404, detail="Restaurant not found")
-    return restaurant
+    if entry := catalog_cache.get_detail(restaurant_id):
+        return entry.to_response(request)
+
+    generation = catalog_cache.generation
+    async with open_session(read_only=True) as session:
+        restaurant = await session.get(Restaurant, restaurant_id,
+                                       options=restaurant_public_options)
+        if not restaurant:
+            raise HTTPException(status_code=404, detail="Restaurant not found")
+
+        etag = make_etag("restaurant", restaurant.id, restaurant.updated_at)
+        body = RestaurantPublic.model_validate(restaurant).model_dump_json().encode()
+
+    entry = CachedJSON(body, etag)
+    catalog_cache.set_detail(restaurant_id, entry, generation)
+    return entry.to_response(request)
 
 
 @router.patch(
     "/me",
     response_model=RestaurantWithDetail
 )
-def update_own_restaurant(
+async def update_own_restaurant(
     data: RestaurantUpdate,
     current: Restaurant = Depends(authenticate_user),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_session)
 ):
     """
     Updates the profile of the currently authenticated restaurant.
@@ -62,12 +224,14 @@ def update_own_restaurant(
     # Update the order object with new values
     for k, v in upd.items():
         setattr(current, k, v)
+    await bump_restaurant(session, current.id, public=True)
 
     # Save changes to the database
-    session.commit()
-    session.refresh(current)
+    await session.commit()
+    principal_cache.invalidate_user(current.id)
+    catalog_cache.invalidate(current.id)
 
-    return current
+    return await reload(session, current, restaurant_detail_options)
 
 
 @router.post(
@@ -75,14 +239,109 @@ def update_own_restaurant(
     status_code=201,
     response_model=FoodPublic
 )
-def add_menu_item(
+async def add_menu_item(
     data: FoodCreate,
-    current: Restaurant = Depends(authenticate_user),
-    session: Session = Depends(get_session)
+    current: Principal = Depends(authenticate_principal),
+    session: AsyncSession = Depends(get_session)
 ):
     """Adds a new food item to the authenticated restaurant's menu."""
+    if current.role != UserType.restaurant:
+        raise unauthorized
     food = Food(**data.model_dump(), restaurant_id=current.id)
     session.add(food)
-    session.commit()
-    session.refresh(food)
+    await bump_restaurant(session, current.id, public=True)
+    await session.commit()
+    catalog_cache.invalidate(current.id)
+    return food
+
+
+async def _own_food(session: AsyncSession, current: Principal, food_id: UUID) -> Food:
+    if current.role != UserType.restaurant:
+        raise unauthorized
+    food = await session.get(Food, food_id)
+    if food is None or food.restaurant_id != current.id or food.removed_at is not None:
+        raise food_not_found
+    return food
+
+
+@router.patch(
+    "/me/menu/{food_id}",
+    response_model=FoodPublic
+)
+async def update_menu_item(
+    food_id: UUID,
+    data: FoodUpdate,
+    current: Principal = Depends(authenticate_principal),
+    session: AsyncSession = Depends(get_session)
+):
+    """Updates the title, price or image of a food on the authenticated restaurant's menu."""
+    food = await _own_food(session, current, food_id)
+    for k, v in data.model_dump(exclude_unset=True).items():
+        setattr(food, k, v)
+    await bump_restaurant(session, current.id, public=True)
+    await session.commit()
+    catalog_cache.invalidate(current.id)
     return food
+
+
+@router.delete("/me/menu/{food_id}", status_code=204)
+async def remove_menu_item(
+    food_id: UUID,
+    current: Principal = Depends(authenticate_principal),
+    session: AsyncSession = Depends(get_session)
+):
+    """
+    Takes a food off the authenticated restaurant's menu.
+    Orders already placed for it keep showing it.
+    """
+    food = await _own_food(session, current, food_id)
+    food.removed_at = datetime.now()
+    await bump_restaurant(session, current.id, public=True)
+    await session.commit()
+    catalog_cache.invalidate(current.id)
+
+
+@router.post(
+    "/me/menu/import",
+    response_model=MenuImportReport
+)
+async def import_menu(
+    request: Request,
+    response: Response,
+    delete_missing: bool = True,
+    dry_run: bool = False,
+    current: Principal = Depends(authenticate_principal),
+    session: AsyncSession = Depends(get_session)
+):
+    """
+    Replaces the authenticated restaurant's menu with an uploaded one, sent as
+    a JSON array of foods or as CSV with a `title,price,image` header row.
+    Rows with an `id` update that food; rows without one update the food with
+    the same title or add a new one. Foods the upload does not list are taken
+    off the menu, unless `delete_missing=false`.
+    All changes are applied in one transaction and reported per row. If any
+    row is rejected, nothing is applied and the report comes with a 422;
+    `dry_run=true` only reports what would change.
+    """
+    if current.role != UserType.restaurant:
+        raise unauthorized
+    upload = MenuImport()
+    # Authentication may have queried through the session; give its connection
+    # back so no transaction waits on the client while the upload is read
+    await session.close()
+    await upload.read(request)
+    report = upload.diff(await current_menu(session, current.id), delete_missing)
+
+    if report.rejected:
+        response.status_code = 422
+        return report
+    if dry_run:
+        return report
+
+    if upload.changed:
+        await upload.apply(session, current.id)
+        await bump_restaurant(session, current.id, public=True)
+        await session.commit()
+        catalog_cache.invalidate(current.id)
+    report.applied = True
+    return report
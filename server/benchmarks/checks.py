@@ -0,0 +1,47 @@
+"""
+Runs the benchmarks that have a pass/fail result, one process each, and
+fails (exit code 1) if any of them does. This is what CI runs; the other
+benchmarks only measure and are run by hand. Usage, from the repository root:
+
+    python -m server.benchmarks.checks [name ...]
+"""
+import argparse
+import subprocess
+import sys
+from time import perf_counter
+
+# Name -> module and arguments. Arguments keep each check to seconds, not minutes.
+CHECKS = {
+    "query_budgets": ("server.benchmarks.query_budgets", []),
+    "query_plans": ("server.benchmarks.query_plans", []),
+    "concurrent_writes": ("server.benchmarks.concurrent_writes",
+                          ["--workers", "4", "--orders", "40", "--concurrency", "10"]),
+    "startup": ("server.benchmarks.startup", []),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("names", nargs="*", metavar="name",
+                        help=f"checks to run, all by default: {', '.join(CHECKS)}")
+    args = parser.parse_args()
+    if unknown := set(args.names) - CHECKS.keys():
+        parser.error(f"unknown checks: {', '.join(sorted(unknown))}")
+
+    failed = []
+    for name in args.names or CHECKS:
+        module, check_args = CHECKS[name]
+        print(f"== {name}", flush=True)
+        start = perf_counter()
+        returncode = subprocess.run([sys.executable, "-m", module, *check_args]).returncode
+        status = "ok" if returncode == 0 else f"FAILED (exit code {returncode})"
+        print(f"== {name}: {status} in {perf_counter() - start:.1f} s\n", flush=True)
+        if returncode != 0:
+            failed.append(name)
+
+    if failed:
+        sys.exit(f"Failed checks: {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import json
+import os
+import subprocess
+import sys
+from statistics import quantiles
+
+PASSWORD = "Benchmark-123"
+
+
+def child_env(database_path: str, **overrides: str) -> dict:
+    """Environment for a benchmark process running the app against a throwaway database."""
+    return {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{database_path}",
+        "JWT_SECRET": os.environ.get("JWT_SECRET", "benchmark-secret"),
+        # Password hashing is not what is being measured
+        "BCRYPT_ROUNDS": "4",
+        "PASSWORD_HASH_WORKERS": "0",
+        # Load generators come from one address and a handful of users
+        "RATE_LIMITS": "false",
+        **overrides,
+    }
+
+
+def run_child(module: str, args: list[str], env: dict) -> subprocess.Popen:
+    """Starts `python -m module --child ...`; its last stdout line must be a JSON result."""
+    return subprocess.Popen(
+        [sys.executable, "-m", module, "--child", *args],
+        env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+    )
+
+
+def child_result(process: subprocess.Popen) -> dict:
+    output, errors = process.communicate()
+    if process.returncode != 0:
+        raise RuntimeError(
+            f"Benchmark process exited with {process.returncode}:\n{errors[-2000:]}")
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def asgi_client(app):
+    import httpx
+
+    # Auth cookies are marked secure, so talk https to the in-process app
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="https://bench")
+
+
+async def seed(restaurant, customer, suffix: str = "") -> dict:
+    """Signs up a restaurant with one menu item and a customer, returning their ids."""
+    rid = (await restaurant.post("/auth/signup/RESTAURANT", json={
+        "username": f"bench{suffix}", "email": f"bench{suffix}@example.com",
+        "password": PASSWORD, "restaurant_name": f"Bench {suffix}"})).json()["id"]
+    food = (await restaurant.post("/restaurants/me/menu", json={
+        "title": "Wrap", "price": 50, "image": "wrap.png"})).json()
+    cid = (await customer.post("/auth/signup/CUSTOMER", json={
+        "username": f"student{suffix}", "email": f"student{suffix}@example.com",
+        "password": PASSWORD})).json()["id"]
+    return {"restaurant_id": rid, "food_id": food["id"], "customer_id": cid}
+
+
+def latency_summary(latencies: list[float]) -> dict:
+    # Percentiles need two samples; a single one is its own percentile
+    if len(latencies) == 1:
+        latencies = latencies * 2
+    p50, p95, p99 = (quantiles(latencies, n=100)[i] for i in (49, 94, 98))
+    return {
+        "p50_ms": round(p50 * 1000, 2),
+        "p95_ms": round(p95 * 1000, 2),
+        "p99_ms": round(p99 * 1000, 2),
+    }
@@ -0,0 +1,106 @@
+"""
+Stress test for concurrent order writes from several worker processes.
+
+Every worker runs the app in-process against the same SQLite file, places
+orders and moves them through their statuses. The run fails if any write is
+rejected, e.g. with "database is locked". Usage, from the repository root:
+
+    python -m server.benchmarks.concurrent_writes --workers 4 --orders 200
+    python -m server.benchmarks.concurrent_writes --no-profile   # SQLAlchemy defaults
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from time import perf_counter
+
+from server.benchmarks.common import asgi_client, child_env, child_result, run_child, seed
+
+STATUSES = ["preparing", "ready", "delivered"]
+CREATE_SCHEMA = "from server.db.session import create_db_and_tables; create_db_and_tables()"
+
+
+async def drive(worker: int, orders: int, concurrency: int) -> dict:
+    # Imported here so the environment set by the parent process is in effect
+    from server.db.session import dispose_engines
+    from server.main import app
+
+    failures = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with asgi_client(app) as restaurant, asgi_client(app) as customer:
+        ids = await seed(restaurant, customer, suffix=str(worker))
+
+        async def one():
+            nonlocal failures
+            async with semaphore:
+                response = await customer.post("/orders/new-order", json=ids)
+                if response.status_code != 201:
+                    failures += 1
+                    return
+                order_id = response.json()["id"]
+                for status in STATUSES:
+                    response = await restaurant.patch(
+                        f"/orders/{order_id}/status", json={"status": status})
+                    failures += response.status_code != 200
+
+        started = perf_counter()
+        # Exceptions raised inside the app (e.g. OperationalError) count as failures too
+        results = await asyncio.gather(*(one() for _ in range(orders)), return_exceptions=True)
+        elapsed = perf_counter() - started
+
+    await dispose_engines()
+    failures += sum(isinstance(r, Exception) for r in results)
+    return {"writes": orders * (1 + len(STATUSES)), "failures": failures, "elapsed": elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--orders", type=int, default=200, help="orders per worker")
+    parser.add_argument("--concurrency", type=int, default=20, help="in-flight orders per worker")
+    parser.add_argument("--no-profile", action="store_true",
+                        help="run with DB_ENGINE_PROFILE=false")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--worker", type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(drive(args.worker, args.orders, args.concurrency))))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = child_env(os.path.join(tmp, "stress.db"),
+                        DB_ENGINE_PROFILE=str(not args.no_profile).lower())
+
+        # Create the schema once, before the workers race each other
+        subprocess.run([sys.executable, "-c", CREATE_SCHEMA], env=env, check=True)
+
+        processes = [
+            run_child("server.benchmarks.concurrent_writes", [
+                "--worker", str(i),
+                "--orders", str(args.orders),
+                "--concurrency", str(args.concurrency),
+            ], env)
+            for i in range(args.workers)
+        ]
+        results = [child_result(p) for p in processes]
+
+    writes = sum(r["writes"] for r in results)
+    failures = sum(r["failures"] for r in results)
+    elapsed = max(r["elapsed"] for r in results)
+    print(json.dumps({
+        "workers": args.workers,
+        "engine_profile": not args.no_profile,
+        "writes": writes,
+        "failures": failures,
+        "writes_per_second": round(writes / elapsed, 1),
+    }, indent=2))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Compares the async database layer with the sync fallback under the same load.
+
+Each mode runs in its own process against a throwaway SQLite file, since the
+mode is picked when the app is imported. Usage, from the repository root:
+
+    python -m server.benchmarks.db_modes --requests 2000 --concurrency 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+from time import perf_counter
+
+from server.benchmarks.common import asgi_client, child_env, child_result, latency_summary, run_child, seed
+
+
+async def drive(total: int, concurrency: int) -> dict:
+    # Imported here so the environment set by the parent process is in effect
+    from server.db.session import create_db_and_tables, dispose_engines
+    from server.main import app
+
+    create_db_and_tables()
+
+    async with asgi_client(app) as restaurant, asgi_client(app) as customer:
+        ids = await seed(restaurant, customer)
+        order = (await customer.post("/orders/new-order", json=ids)).json()
+
+        # A mix of the polling traffic seen at lunch time
+        requests = [
+            (customer, f"/orders/{order['id']}"),
+            (restaurant, "/restaurants/me/orders"),
+            (customer, "/restaurants/"),
+        ]
+        latencies: list[float] = []
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(i: int):
+            session, path = requests[i % len(requests)]
+            async with semaphore:
+                started = perf_counter()
+                response = await session.get(path)
+                latencies.append(perf_counter() - started)
+                response.raise_for_status()
+
+        started = perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = perf_counter() - started
+
+    await dispose_engines()
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "throughput_rps": round(total / elapsed, 1),
+        **latency_summary(latencies),
+    }
+
+
+def run_mode(async_database: bool, total: int, concurrency: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        env = child_env(os.path.join(tmp, "bench.db"),
+                        ASYNC_DATABASE=str(async_database).lower())
+        process = run_child("server.benchmarks.db_modes", [
+            "--requests", str(total),
+            "--concurrency", str(concurrency),
+        ], env)
+        return child_result(process)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(drive(args.requests, args.concurrency))))
+        return
+
+    results = {
+        "async": run_mode(True, args.requests, args.concurrency),
+        "sync": run_mode(False, args.requests, args.concurrency),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Measures order throughput with and without the order write pipeline.
+
+For each number of concurrent clients, a fresh process runs the app in-process
+against a new SQLite file; every client places orders back to back and moves
+each one to "preparing", so inserts and status updates compete for the writer.
+The same run is repeated with ORDER_WRITE_PIPELINE on, where those writes are
+group-committed. Usage, from the repository root:
+
+    python -m server.benchmarks.group_commit --clients 1 10 100 --orders 500
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from time import perf_counter
+
+from server.benchmarks.common import (
+    asgi_client, child_env, child_result, latency_summary, run_child, seed,
+)
+from server.benchmarks.concurrent_writes import CREATE_SCHEMA
+
+
+def metric(text: str, name: str) -> float:
+    """Value of an unlabelled sample in the Prometheus text format; 0 if it was never recorded."""
+    for line in text.splitlines():
+        if line.startswith(f"{name} "):
+            return float(line.split()[1])
+    return 0
+
+
+async def drive(clients: int, orders: int) -> dict:
+    # Imported here so the environment set by the parent process is in effect
+    from server.db.session import dispose_engines
+    from server.main import app
+
+    failures = 0
+    latencies = []
+
+    async with asgi_client(app) as restaurant, asgi_client(app) as customer:
+        ids = await seed(restaurant, customer)
+        # Shared by the clients, so the total is the same at every concurrency
+        remaining = iter(range(orders))
+
+        async def client():
+            nonlocal failures
+            for _ in remaining:
+                started = perf_counter()
+                response = await customer.post("/orders/new-order", json=ids)
+                latencies.append(perf_counter() - started)
+                if response.status_code != 201:
+                    failures += 1
+                    continue
+                response = await restaurant.patch(
+                    f"/orders/{response.json()['id']}/status", json={"status": "preparing"})
+                failures += response.status_code != 200
+
+        started = perf_counter()
+        results = await asyncio.gather(*(client() for _ in range(clients)), return_exceptions=True)
+        elapsed = perf_counter() - started
+
+        metrics = (await customer.get("/metrics")).text
+
+    await dispose_engines()
+    failures += sum(isinstance(r, Exception) for r in results)
+    batches = metric(metrics, "write_pipeline_batch_size_count")
+    return {
+        "orders_per_second": round(orders / elapsed, 1),
+        **latency_summary(latencies),
+        "jobs_per_commit": round(metric(metrics, "write_pipeline_batch_size_sum") / batches, 1)
+        if batches else None,
+        "failures": failures,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--orders", type=int, default=500, help="orders per run")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(drive(args.clients[0], args.orders))))
+        return
+
+    results = []
+    for clients in args.clients:
+        for pipeline in (False, True):
+            with tempfile.TemporaryDirectory() as tmp:
+                env = child_env(os.path.join(tmp, "bench.db"),
+                                ORDER_WRITE_PIPELINE=str(pipeline).lower())
+                subprocess.run([sys.executable, "-c", CREATE_SCHEMA], env=env, check=True,
+                               stdout=subprocess.DEVNULL)
+                result = child_result(run_child("server.benchmarks.group_commit", [
+                    "--clients", str(clients), "--orders", str(args.orders)], env))
+            results.append({"clients": clients, "pipeline": pipeline, **result})
+
+    print(json.dumps(results, indent=2))
+    sys.exit(1 if any(r["failures"] for r in results) else 0)
+
+
+if __name__ == "__main__":
+    main()
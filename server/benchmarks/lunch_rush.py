@@ -0,0 +1,218 @@
+"""
+Simulates a lunch rush and reports latency, throughput and queries per route.
+
+Restaurants and customers are signed up first. Then every customer signs in,
+browses the catalog, orders and polls the order until it is ready, while
+every restaurant polls its profile and moves orders through their statuses.
+The app runs in-process in a child process against a throwaway SQLite file.
+
+Results are printed as JSON and can be saved with `--output`. Pass a saved run as
+`--baseline` to fail (exit code 1) when a route got slower, or issues more
+queries per request, by more than `--threshold`. The baseline must have been
+run with the same scenario options. Usage, from the repository root:
+
+    python -m server.benchmarks.lunch_rush --restaurants 10 --customers 200 --output rush.json
+    python -m server.benchmarks.lunch_rush --baseline rush.json --threshold 0.2
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+from collections import defaultdict
+from time import perf_counter
+
+from server.benchmarks.common import (
+    PASSWORD, asgi_client, child_env, child_result, latency_summary, run_child,
+)
+from server.db.query_count import count_queries
+
+class Recorder:
+    """Collects the latency and query count of every request, by route."""
+
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.queries: dict[str, int] = defaultdict(int)
+        self.failures: dict[str, int] = defaultdict(int)
+
+    async def send(self, client, method: str, route: str, path: str | None = None, **kwargs):
+        started = perf_counter()
+        # Counts only this request, even with many others in flight
+        with count_queries() as counter:
+            try:
+                response = await client.request(method, path or route, **kwargs)
+            finally:
+                self.latencies[f"{method} {route}"].append(perf_counter() - started)
+                self.queries[f"{method} {route}"] += counter.count
+
+        if response.is_error:
+            self.failures[f"{method} {route}"] += 1
+        return response
+
+    def report(self, elapsed: float) -> dict:
+        routes = {}
+        for route, latencies in sorted(self.latencies.items()):
+            routes[route] = {
+                "requests": len(latencies),
+                "failures": self.failures[route],
+                "throughput_rps": round(len(latencies) / elapsed, 1),
+                "queries_per_request": round(self.queries[route] / len(latencies), 2),
+                **latency_summary(latencies),
+            }
+        total = sum(len(latencies) for latencies in self.latencies.values())
+        return {
+            "requests": total,
+            "failures": sum(self.failures.values()),
+            "elapsed_s": round(elapsed, 2),
+            "throughput_rps": round(total / elapsed, 1),
+            "routes": routes,
+        }
+
+
+async def drive(restaurants: int, customers: int, menu_size: int, poll_interval: float) -> dict:
+    # Imported here so the environment set by the parent process is in effect
+    from server.db.session import create_db_and_tables, dispose_engines
+    from server.main import app
+
+    create_db_and_tables()
+
+    # Sign-ups are setup, not part of the rush
+    kitchens = []
+    for i in range(restaurants):
+        async with asgi_client(app) as client:
+            await client.post("/auth/signup/RESTAURANT", json={
+                "username": f"kitchen{i}", "email": f"kitchen{i}@example.com",
+                "password": PASSWORD, "restaurant_name": f"Kitchen {i}"})
+            for j in range(menu_size):
+                await client.post("/restaurants/me/menu", json={
+                    "title": f"Dish {j}", "price": 40 + j, "image": "dish.png"})
+        kitchens.append(f"kitchen{i}@example.com")
+
+    students = [f"student{i}@example.com" for i in range(customers)]
+    for i, email in enumerate(students):
+        async with asgi_client(app) as client:
+            await client.post("/auth/signup/CUSTOMER", json={
+                "username": f"student{i}", "email": email, "password": PASSWORD})
+
+    recorder = Recorder()
+    customers_done = asyncio.Event()
+
+    async def customer(i: int, email: str):
+        async with asgi_client(app) as client:
+            me = (await recorder.send(client, "POST", "/auth/signin/CUSTOMER", json={
+                "email": email, "password": PASSWORD})).json()
+            catalog = (await recorder.send(client, "GET", "/restaurants/")).json()
+            choice = catalog[i % len(catalog)]
+            await recorder.send(client, "GET", "/restaurants/{id}", f"/restaurants/{choice['id']}")
+
+            order = (await recorder.send(client, "POST", "/orders/new-order", json={
+                "customer_id": me["id"], "restaurant_id": choice["id"],
+                "food_id": choice["menu"][i % len(choice["menu"])]["id"]})).json()
+
+            while True:
+                await asyncio.sleep(poll_interval)
+                current = (await recorder.send(
+                    client, "GET", "/orders/{id}", f"/orders/{order['id']}")).json()
+                if current["status"] == "ready":
+                    return
+
+    async def restaurant(email: str):
+        next_status = {"pending": "preparing", "preparing": "ready"}
+        async with asgi_client(app) as client:
+            await recorder.send(client, "POST", "/auth/signin/RESTAURANT", json={
+                "email": email, "password": PASSWORD})
+            while not customers_done.is_set():
+                profile = (await recorder.send(client, "GET", "/restaurants/me")).json()
+                for order in profile["orders"]:
+                    if order["status"] in next_status:
+                        await recorder.send(
+                            client, "PATCH", "/orders/{id}/status", f"/orders/{order['id']}/status",
+                            json={"status": next_status[order["status"]]})
+                await asyncio.sleep(poll_interval)
+
+    async def all_customers():
+        await asyncio.gather(*(customer(i, email) for i, email in enumerate(students)))
+        customers_done.set()
+
+    started = perf_counter()
+    await asyncio.gather(all_customers(), *(restaurant(email) for email in kitchens))
+    elapsed = perf_counter() - started
+
+    await dispose_engines()
+    return recorder.report(elapsed)
+
+
+def compare(result: dict, baseline: dict, threshold: float) -> list[str]:
+    """Lists the routes that regressed against the baseline."""
+    regressions = []
+    for route, current in result["routes"].items():
+        before = baseline["routes"].get(route)
+        if before is None:
+            continue
+        if current["p95_ms"] > before["p95_ms"] * (1 + threshold):
+            regressions.append(
+                f"{route}: p95 {before['p95_ms']} ms -> {current['p95_ms']} ms")
+        # Cache hits make some of these averages fractional, hence the threshold here as well
+        if current["queries_per_request"] > before["queries_per_request"] * (1 + threshold):
+            regressions.append(
+                f"{route}: {before['queries_per_request']} -> "
+                f"{current['queries_per_request']} queries per request")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--restaurants", type=int, default=10)
+    parser.add_argument("--customers", type=int, default=200)
+    parser.add_argument("--menu-size", type=int, default=5)
+    parser.add_argument("--poll-interval", type=float, default=0.05,
+                        help="seconds between two polls of the same client")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON file of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="allowed increase of p95 latency and queries per route, "
+                             "as a fraction of the baseline")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        result = asyncio.run(drive(
+            args.restaurants, args.customers, args.menu_size, args.poll_interval))
+        print(json.dumps(result))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        process = run_child("server.benchmarks.lunch_rush", [
+            "--restaurants", str(args.restaurants),
+            "--customers", str(args.customers),
+            "--menu-size", str(args.menu_size),
+            "--poll-interval", str(args.poll_interval),
+        ], child_env(os.path.join(tmp, "bench.db")))
+        result = child_result(process)
+
+    result["config"] = {
+        "restaurants": args.restaurants,
+        "customers": args.customers,
+        "menu_size": args.menu_size,
+        "poll_interval": args.poll_interval,
+    }
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("config") != result["config"]:
+            sys.exit(f"The baseline was run with another scenario: {baseline.get('config')}")
+        regressions = compare(result, baseline, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
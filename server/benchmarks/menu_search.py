@@ -0,0 +1,124 @@
+"""
+Compares menu search through the FTS5 index with a LIKE '%...%' scan.
+
+A fresh database is seeded with many restaurants and a large menu each, then
+every query is run through `fts_search` and `like_search` (the first page of
+20, as `/foods/search` serves it, and the full match count). Usage, from the
+repository root:
+
+    python -m server.benchmarks.menu_search --restaurants 2000 --menu 50
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+from time import perf_counter
+from uuid import uuid4
+
+from server.benchmarks.common import child_env, child_result, run_child
+
+ADJECTIVES = ["spicy", "crispy", "veggie", "grilled", "smoky", "classic", "vegan", "cheesy",
+              "garlic", "lemon", "honey", "sweet", "tandoori", "teriyaki", "roasted", "fresh"]
+DISHES = ["wrap", "burger", "noodles", "salad", "pizza", "curry", "tacos", "burrito",
+          "falafel", "ramen", "risotto", "kebab", "sandwich", "soup", "pasta", "bowl"]
+EXTRAS = ["with fries", "with rice", "platter", "combo", "deluxe", "bites", "", "", "", ""]
+
+QUERIES = [
+    {"q": "veggie wrap"},
+    {"q": "veggie wrap", "max_price": 60},
+    {"q": "chick"},
+    {"q": "ram"},
+    {"q": "spicy noodles with"},
+    {"q": "kitchen 42"},
+]
+
+
+def seed(engine, restaurants: int, menu: int) -> None:
+    from sqlalchemy import insert
+    from server.db.models import Food, Restaurant
+
+    rng = random.Random(1)
+    with engine.begin() as conn:
+        for i in range(restaurants):
+            rid = uuid4()
+            conn.execute(insert(Restaurant), [{
+                "id": rid, "username": f"kitchen{i}", "email": f"kitchen{i}@example.com",
+                "password": "x", "restaurant_name": f"Kitchen {i}"}])
+            conn.execute(insert(Food), [{
+                "id": uuid4(), "restaurant_id": rid, "image": "dish.png",
+                "price": rng.randrange(20, 150),
+                "title": " ".join(filter(None, (
+                    rng.choice(ADJECTIVES), rng.choice(["chicken", "beef", "tofu", "paneer", ""]),
+                    rng.choice(DISHES), rng.choice(EXTRAS)))).capitalize(),
+            } for _ in range(menu)])
+
+
+def timed(run, repeat: int) -> tuple[float, object]:
+    """Best of `repeat` runs in milliseconds, and the last result."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = perf_counter()
+        result = run()
+        best = min(best, perf_counter() - started)
+    return round(best * 1000, 2), result
+
+
+def measure(restaurants: int, menu: int, repeat: int) -> dict:
+    # Imported here so the environment set by the parent process is in effect
+    from sqlmodel import Session, func, select
+    from server.db.session import create_db_and_tables, engine
+    from server.services.search import fts_search, like_search, rebuild_search_index, search_terms
+
+    create_db_and_tables()
+    started = perf_counter()
+    seed(engine, restaurants, menu)
+    seeded = perf_counter() - started
+    with engine.begin() as conn:
+        started = perf_counter()
+        rebuild_search_index(conn)
+        rebuild = perf_counter() - started
+
+    results = []
+    with Session(engine) as session:
+        for params in QUERIES:
+            terms = search_terms(params["q"])
+            filters = (params.get("min_price"), params.get("max_price"))
+            row = {**params}
+            for name, search in (("fts", fts_search), ("like", like_search)):
+                query = search(terms, *filters)
+                row[f"{name}_page_ms"], _ = timed(lambda: session.exec(query.limit(20)).all(), repeat)
+                count = select(func.count()).select_from(query.order_by(None).subquery())
+                row[f"{name}_count_ms"], row[f"{name}_matches"] = timed(
+                    lambda: session.exec(count).one(), repeat)
+            results.append(row)
+
+    return {
+        "foods": restaurants * menu,
+        "seed_s": round(seeded, 1),
+        "rebuild_index_s": round(rebuild, 2),
+        "queries": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--restaurants", type=int, default=2000)
+    parser.add_argument("--menu", type=int, default=50, help="foods per restaurant")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.restaurants, args.menu, args.repeat)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        result = child_result(run_child("server.benchmarks.menu_search", [
+            "--restaurants", str(args.restaurants), "--menu", str(args.menu),
+            "--repeat", str(args.repeat)], child_env(os.path.join(tmp, "search.db"))))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Checks every route against a fixed budget of SQL queries per request.
+
+Each route is called under `assert_max_queries` against a database where
+every list a response holds (menus, orders, likes, restaurants) has several
+rows, so an N+1 regression shows up as queries over budget. The check runs
+in async and in sync mode and fails (exit code 1) if a route goes over its
+budget, or if a route has no budget yet. Usage, from the repository root:
+
+    python -m server.benchmarks.query_budgets
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+from contextlib import AsyncExitStack
+
+from server.benchmarks.common import PASSWORD, asgi_client, child_env, child_result, run_child
+
+# Most queries one request may issue. Measured with cold caches; raise a
+# budget only together with the change that needs it.
+BUDGETS = {
+    "POST /auth/signup/{user_role}": 4,
+    "POST /auth/signin/{user_role}": 5,
+    "POST /auth/signout": 0,
+    "GET /auth/me": 4,
+    "GET /restaurants/": 3,
+    "GET /restaurants/{restaurant_id}": 2,
+    "GET /restaurants/me": 4,
+    "PATCH /restaurants/me": 6,
+    "GET /restaurants/me/orders": 1,
+    "GET /restaurants/me/orders/stream": 0,
+    "GET /restaurants/me/analytics": 2,
+    "POST /restaurants/me/menu": 3,
+    "PATCH /restaurants/me/menu/{food_id}": 3,
+    "DELETE /restaurants/me/menu/{food_id}": 4,
+    "POST /restaurants/me/menu/import": 4,
+    "PATCH /customers/me/liked-restaurants": 4,
+    "POST /customers/me/liked-restaurants/batch": 3,
+    "GET /customers/": 4,
+    "GET /customers/me": 6,
+    "GET /customers/me/orders/stream": 0,
+    "GET /customers/{customer_id}": 4,
+    "POST /orders/new-order": 6,
+    "POST /orders/batch": 6,
+    "PATCH /orders/{order_id}/status": 4,
+    "GET /orders/history": 2,
+    "GET /orders/{order_id}": 1,
+    "GET /orders/{order_id}/stream": 1,
+    "GET /foods/search": 1,
+    "GET /metrics": 0,
+}
+
+# Routes of the framework rather than the app
+SKIPPED_ROUTES = {"/openapi.json", "/docs", "/docs/oauth2-redirect", "/redoc"}
+
+# Restaurants, foods per menu, and orders and likes of the customer
+ROWS = 3
+
+# Server-sent event streams never end; they are cut off once their setup is done
+STREAM_SECONDS = 0.3
+
+
+async def measure() -> dict:
+    # Imported here so the environment set by the parent process is in effect
+    from server.db.query_count import assert_max_queries
+    from server.db.session import create_db_and_tables, dispose_engines
+    from server.main import app
+
+    create_db_and_tables()
+    results = {}
+
+    async def call(client, method: str, route: str, path: str | None = None, **kwargs):
+        key = f"{method} {route}"
+        result = results[key] = {"budget": BUDGETS.get(key), "error": None}
+        try:
+            with assert_max_queries(BUDGETS.get(key, 0)) as counter:
+                if route.endswith("/stream"):
+                    try:
+                        await asyncio.wait_for(client.get(path or route), STREAM_SECONDS)
+                    except TimeoutError:
+                        pass
+                    response = None
+                else:
+                    response = await client.request(method, path or route, **kwargs)
+        except AssertionError as error:
+            result["error"] = str(error)
+        result["queries"] = counter.count
+        if response is not None and response.is_error:
+            result["error"] = f"{response.status_code} {response.text[:200]}"
+        return response
+
+    async with AsyncExitStack() as clients:
+        customer = await clients.enter_async_context(asgi_client(app))
+        restaurants = [await clients.enter_async_context(asgi_client(app)) for _ in range(ROWS)]
+        kitchen = restaurants[0]
+
+        ids, menus = [], []
+        for i, client in enumerate(restaurants):
+            signup = {"username": f"kitchen{i}", "email": f"kitchen{i}@example.com",
+                      "password": PASSWORD, "restaurant_name": f"Kitchen {i}"}
+            if i == 0:
+                response = await call(client, "POST", "/auth/signup/{user_role}",
+                                      "/auth/signup/RESTAURANT", json=signup)
+            else:
+                response = await client.post("/auth/signup/RESTAURANT", json=signup)
+            ids.append(response.json()["id"])
+            menu = []
+            for j in range(ROWS):
+                dish = {"title": f"Dish {j}", "price": 40 + j, "image": "dish.png"}
+                if i == 0 and j == 0:
+                    response = await call(client, "POST", "/restaurants/me/menu", json=dish)
+                else:
+                    response = await client.post("/restaurants/me/menu", json=dish)
+                menu.append(response.json()["id"])
+            menus.append(menu)
+
+        cid = (await customer.post("/auth/signup/CUSTOMER", json={
+            "username": "student", "email": "student@example.com", "password": PASSWORD,
+        })).json()["id"]
+        await call(customer, "PATCH", "/customers/me/liked-restaurants",
+                   json={"restaurant_id": ids[0]})
+        await call(customer, "POST", "/customers/me/liked-restaurants/batch", json={
+            "changes": [{"restaurant_id": rid, "liked": True} for rid in ids[1:]]})
+
+        order = (await call(customer, "POST", "/orders/new-order", json={
+            "customer_id": cid, "restaurant_id": ids[0], "food_id": menus[0][0]})).json()
+        await call(customer, "POST", "/orders/batch", json={
+            "customer_id": cid, "restaurant_id": ids[1],
+            "lines": [{"food_id": food_id} for food_id in menus[1]]})
+        await call(kitchen, "PATCH", "/orders/{order_id}/status",
+                   f"/orders/{order['id']}/status", json={"status": "preparing"})
+
+        await call(customer, "GET", "/restaurants/")
+        await call(customer, "GET", "/restaurants/{restaurant_id}", f"/restaurants/{ids[0]}")
+        await call(kitchen, "GET", "/restaurants/me")
+        await call(kitchen, "GET", "/restaurants/me/orders")
+        await call(kitchen, "GET", "/restaurants/me/analytics")
+        await call(customer, "GET", "/customers/me")
+        await call(customer, "GET", "/customers/{customer_id}", f"/customers/{cid}")
+        await call(customer, "GET", "/customers/")
+        await call(customer, "GET", "/orders/history")
+        await call(customer, "GET", "/orders/{order_id}", f"/orders/{order['id']}")
+        await call(customer, "GET", "/foods/search", params={"q": "dish"})
+        await call(customer, "GET", "/auth/me")
+        await call(customer, "GET", "/metrics")
+
+        await call(customer, "GET", "/orders/{order_id}/stream", f"/orders/{order['id']}/stream")
+        await call(customer, "GET", "/customers/me/orders/stream")
+        await call(kitchen, "GET", "/restaurants/me/orders/stream")
+
+        await call(kitchen, "PATCH", "/restaurants/me/menu/{food_id}",
+                   f"/restaurants/me/menu/{menus[0][1]}", json={"price": 45})
+        await call(kitchen, "POST", "/restaurants/me/menu/import", json=[
+            {"title": f"Dish {j}", "price": 50 + j, "image": "dish.png"} for j in range(ROWS + 1)])
+        await call(kitchen, "PATCH", "/restaurants/me", json={"avg_wait_time": 20})
+        await call(kitchen, "DELETE", "/restaurants/me/menu/{food_id}",
+                   f"/restaurants/me/menu/{menus[0][2]}")
+
+        await call(customer, "POST", "/auth/signin/{user_role}", "/auth/signin/CUSTOMER",
+                   json={"email": "student@example.com", "password": PASSWORD})
+        await call(customer, "POST", "/auth/signout")
+
+    routes = {f"{method} {route.path}" for route in app.routes
+              if route.path not in SKIPPED_ROUTES for method in getattr(route, "methods", ()) or ()}
+    for key in sorted(routes - results.keys()):
+        results[key] = {"budget": BUDGETS.get(key), "queries": None, "error": "Never called"}
+    for key, result in results.items():
+        if result["budget"] is None:
+            result["error"] = result["error"] or "No budget"
+
+    await dispose_engines()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(measure())))
+        return
+
+    failures = 0
+    for mode in ("true", "false"):
+        with tempfile.TemporaryDirectory() as tmp:
+            results = child_result(run_child("server.benchmarks.query_budgets", [], child_env(
+                os.path.join(tmp, "budgets.db"), ASYNC_DATABASE=mode)))
+        print(f"ASYNC_DATABASE={mode}")
+        for key, result in sorted(results.items()):
+            failures += result["error"] is not None
+            status = "ok  " if result["error"] is None else "FAIL"
+            print(f"  {status} {key}: {result['queries']} of {result['budget']} queries")
+            if result["error"]:
+                print("       " + result["error"].replace("\n", "\n       "))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
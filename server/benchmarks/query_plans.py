@@ -0,0 +1,86 @@
+"""
+Checks that the hot queries are answered from indexes rather than table scans.
+
+Runs EXPLAIN QUERY PLAN for each query on a freshly migrated SQLite database
+and exits non-zero if any of them scans a table. Usage, from the repository root:
+
+    python -m server.benchmarks.query_plans
+"""
+import os
+import sys
+import tempfile
+from datetime import datetime
+from uuid import uuid4
+
+
+def hot_queries() -> dict:
+    from sqlmodel import select
+    from server.db.models import (
+        ArchivedOrder, Customer, CustomerRestaurantLink, Food, Order, OrderRollup, Restaurant,
+    )
+    from server.db.schemas import ACTIVE_ORDER_STATUSES
+    from server.services.archive import TERMINAL_ORDER_STATUSES
+
+    some_id = uuid4()
+    return {
+        "active orders of a restaurant": select(Order)
+        .where(Order.restaurant_id == some_id, Order.status.in_(ACTIVE_ORDER_STATUSES))
+        .order_by(Order.created_at.desc()),
+        "orders of a restaurant changed since": select(Order)
+        .where(Order.restaurant_id == some_id, Order.updated_at > datetime.now()),
+        "order history of a customer": select(Order)
+        .where(Order.customer_id == some_id).order_by(Order.created_at),
+        "menu of a restaurant": select(Food)
+        .where(Food.restaurant_id == some_id, Food.removed_at.is_(None)),
+        "orders due for archival": select(Order.id)
+        .where(Order.status.in_(TERMINAL_ORDER_STATUSES), Order.updated_at < datetime.now()),
+        "archived orders of a customer": select(ArchivedOrder)
+        .where(ArchivedOrder.customer_id == some_id).order_by(ArchivedOrder.created_at),
+        "hourly sales of a restaurant": select(OrderRollup)
+        .where(OrderRollup.restaurant_id == some_id, OrderRollup.hour >= datetime.now())
+        .order_by(OrderRollup.hour),
+        "restaurants liked by a customer": select(CustomerRestaurantLink)
+        .where(CustomerRestaurantLink.customer_id == some_id),
+        "customers who like a restaurant": select(CustomerRestaurantLink.customer_id)
+        .where(CustomerRestaurantLink.restaurant_id == some_id),
+        "page of customers": select(Customer)
+        .where(Customer.created_at > datetime.now()).order_by(Customer.created_at, Customer.id),
+        "page of restaurants": select(Restaurant)
+        .where(Restaurant.created_at > datetime.now()).order_by(Restaurant.created_at, Restaurant.id),
+    }
+
+
+def uses_index(plan: list[str]) -> bool:
+    # "SCAN t USING INDEX" walks an index in order; a bare "SCAN t" reads the whole table
+    return all(
+        "USING" in step or not step.startswith("SCAN")
+        for step in plan
+    )
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'plans.db')}"
+        os.environ.setdefault("JWT_SECRET", "query-plans")
+
+        from server.db.session import create_db_and_tables, engine
+        create_db_and_tables()
+
+        failures = 0
+        with engine.connect() as conn:
+            for name, query in hot_queries().items():
+                compiled = query.compile(engine, compile_kwargs={"render_postcompile": True})
+                # Plans do not depend on the bound values
+                params = tuple(None for _ in compiled.positiontup)
+                rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params).all()
+                plan = [row[-1] for row in rows]
+                ok = uses_index(plan)
+                failures += not ok
+                print(f"{'ok  ' if ok else 'SCAN'} {name}: {' | '.join(plan)}")
+        engine.dispose()
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
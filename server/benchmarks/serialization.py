@@ -0,0 +1,100 @@
+"""
+Measures the cost of turning loaded models into a response body.
+
+Large `RestaurantWithDetail` and `CustomerPublic` payloads are built in memory
+and serialized the way FastAPI does it by default (validation against the
+response model, then `JSONResponse`), with `ORJSONResponse`, and through
+`model_response`. No database is involved. Usage, from the repository root:
+
+    python -m server.benchmarks.serialization --orders 2000 --menu 100
+"""
+import argparse
+import asyncio
+import json
+from time import perf_counter
+
+
+def build_payloads(orders: int, menu: int, liked: int):
+    from server.db.models import Customer, Food, Order, Restaurant
+
+    def restaurant(i: int) -> Restaurant:
+        r = Restaurant(username=f"kitchen{i}", email=f"kitchen{i}@example.com",
+                       password="x", restaurant_name=f"Kitchen {i}")
+        r.menu = [Food(title=f"Dish {j}", price=40 + j, image="dish.png", restaurant_id=r.id)
+                  for j in range(menu)]
+        return r
+
+    kitchen = restaurant(0)
+    customer = Customer(username="student", email="student@example.com", password="x")
+    for i in range(orders):
+        Order(customer=customer, restaurant=kitchen, food=kitchen.menu[i % menu],
+              customer_id=customer.id, restaurant_id=kitchen.id,
+              food_id=kitchen.menu[i % menu].id, queue_ticket=i + 1)
+    customer.liked_restaurants = [restaurant(i) for i in range(1, liked + 1)]
+    return kitchen, customer
+
+
+def timed(fn, repeat: int) -> float:
+    """Best of `repeat` runs, in milliseconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = perf_counter()
+        fn()
+        best = min(best, perf_counter() - started)
+    return round(best * 1000, 2)
+
+
+def measure(schema, instance, repeat: int) -> dict:
+    from fastapi.responses import JSONResponse, ORJSONResponse
+    from fastapi.routing import serialize_response
+    from fastapi.utils import create_model_field
+    from server.utils.responses import model_response
+
+    field = create_model_field(name="response", type_=schema, mode="serialization")
+
+    loop = asyncio.new_event_loop()
+
+    def fastapi_default(response_class):
+        def run():
+            content = loop.run_until_complete(
+                serialize_response(field=field, response_content=instance))
+            return response_class(content).body
+        return run
+
+    def fast_path():
+        return model_response(schema.model_validate(instance)).body
+
+    # All paths must produce the same document
+    documents = {json.dumps(json.loads(fn()), sort_keys=True) for fn in (
+        fastapi_default(JSONResponse), fastapi_default(ORJSONResponse), fast_path)}
+    assert len(documents) == 1, "serialization paths disagree"
+
+    result = {
+        "bytes": len(fast_path()),
+        "fastapi_json_ms": timed(fastapi_default(JSONResponse), repeat),
+        "fastapi_orjson_ms": timed(fastapi_default(ORJSONResponse), repeat),
+        "model_response_ms": timed(fast_path, repeat),
+    }
+    loop.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--menu", type=int, default=100)
+    parser.add_argument("--liked", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    from server.db.schemas import CustomerPublic, RestaurantWithDetail
+
+    restaurant, customer = build_payloads(args.orders, args.menu, args.liked)
+    print(json.dumps({
+        "RestaurantWithDetail": measure(RestaurantWithDetail, restaurant, args.repeat),
+        "CustomerPublic": measure(CustomerPublic, customer, args.repeat),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Checks that a new worker is ready to serve within a time budget.
+
+Each run starts a fresh interpreter that imports the app and runs its startup
+against a database that is already at the latest schema version, i.e. what a
+worker added during the lunch rush goes through. The run fails (exit code 1)
+if the best time exceeds `--budget-ms`, or if a module meant to be imported
+lazily was loaded at startup. Usage, from the repository root:
+
+    python -m server.benchmarks.startup --budget-ms 1500
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+from server.benchmarks.common import child_env
+
+# Only needed once a password is hashed or a token decoded
+LAZY_MODULES = ["passlib", "bcrypt", "jwt"]
+
+STARTUP = f"""
+import json, sys
+from time import perf_counter
+started = perf_counter()
+import server.main
+imported = perf_counter()
+from server.db.session import create_db_and_tables
+create_db_and_tables()
+ready = perf_counter()
+print(json.dumps({{
+    "import_ms": (imported - started) * 1000,
+    "startup_ms": (ready - started) * 1000,
+    "eager": [m for m in {LAZY_MODULES!r} if m in sys.modules],
+}}))
+"""
+
+
+def run_once(env: dict, profile: bool = False) -> tuple[dict, str]:
+    command = [sys.executable, *(["-X", "importtime"] if profile else []), "-c", STARTUP]
+    process = subprocess.run(command, env=env, capture_output=True, text=True)
+    if process.returncode != 0:
+        raise RuntimeError(f"Startup failed:\n{process.stderr[-2000:]}")
+    return json.loads(process.stdout.strip().splitlines()[-1]), process.stderr
+
+
+def slowest_imports(profile: str, top: int) -> list[dict]:
+    """Top-level imports of the app by cumulative time, from `-X importtime` output."""
+    modules = []
+    for line in profile.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \|( *)(\S+)", line)
+        # The report indents by two spaces per level: keep the app and its direct imports
+        if match and len(match.group(2)) <= 3:
+            modules.append({"module": match.group(3), "ms": round(int(match.group(1)) / 1000, 1)})
+    return sorted(modules, key=lambda m: m["ms"], reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--budget-ms", type=float, default=1500)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to report")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = child_env(os.path.join(tmp, "bench.db"))
+        # The first start creates the schema, as the first worker of a deployment does
+        run_once(env)
+        runs = [run_once(env)[0] for _ in range(args.runs)]
+        _, profile = run_once(env, profile=True)
+
+    best = min(runs, key=lambda run: run["startup_ms"])
+    result = {
+        "budget_ms": args.budget_ms,
+        "import_ms": round(best["import_ms"], 1),
+        "startup_ms": round(best["startup_ms"], 1),
+        "eager_lazy_modules": best["eager"],
+        "slowest_imports": slowest_imports(profile, args.top),
+    }
+    print(json.dumps(result, indent=2))
+
+    if best["eager"]:
+        sys.exit(f"Imported at startup, but meant to be lazy: {', '.join(best['eager'])}")
+    if best["startup_ms"] > args.budget_ms:
+        sys.exit(f"Startup took {best['startup_ms']:.0f} ms, over the {args.budget_ms:.0f} ms budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,26 @@ env_path = path.join(path.dirname(__file__), ".env")
 load_dotenv(dotenv_path=env_path)
 
 DATABASE_URL = getenv("DATABASE_URL")
+# Serve requests through the async engine; set to "false" to fall back to the sync engine
+ASYNC_DATABASE = getenv("ASYNC_DATABASE", "true").lower() == "true"
+
+# SQLite engine profile, applied to every new connection.
+# Set DB_ENGINE_PROFILE=false to get SQLAlchemy's defaults back.
+DB_ENGINE_PROFILE = getenv("DB_ENGINE_PROFILE", "true").lower() == "true"
+SQLITE_PRAGMAS = {
+    # Readers no longer block the writer and vice versa
+    "journal_mode": getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    # Safe with WAL; only the last transactions can be lost on power failure
+    "synchronous": getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    # Wait for the write lock instead of failing with "database is locked"
+    "busy_timeout": int(getenv("SQLITE_BUSY_TIMEOUT_MS", 5000)),
+    # Negative values are KiB: 20 MB of page cache per connection
+    "cache_size": int(getenv("SQLITE_CACHE_SIZE", -20000)),
+    "mmap_size": int(getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)),
+    "temp_store": getenv("SQLITE_TEMP_STORE", "MEMORY"),
+}
+# Connections of the read-only engine that serves GET requests
+DB_READ_POOL_SIZE = int(getenv("DB_READ_POOL_SIZE", 8))
 JWT_SECRET = getenv("JWT_SECRET")
 CLIENT_URL = getenv("CLIENT_URL")
 
@@ -12,3 +32,94 @@ CLIENT_URL = getenv("CLIENT_URL")
 ALGORITHM = "HS256"
 
 ACCESS_TOKEN_EXPIRE_DAYS = 15
+
+# bcrypt work factor; existing hashes with another cost are upgraded on sign-in
+BCRYPT_ROUNDS = int(getenv("BCRYPT_ROUNDS", 12))
+# Processes dedicated to password hashing (0 hashes on the calling thread)
+PASSWORD_HASH_WORKERS = int(getenv("PASSWORD_HASH_WORKERS", 2))
+# Hashing jobs allowed to wait for a worker before requests are rejected with 503
+PASSWORD_HASH_MAX_PENDING = int(getenv("PASSWORD_HASH_MAX_PENDING", 32))
+
+# Weight of the newest sample in the rolling wait-time statistics of a restaurant
+WAIT_TIME_EWMA_ALPHA = 0.2
+
+# Delivered and cancelled orders move to the archive table once unchanged for this long
+ORDER_ARCHIVE_AFTER_DAYS = float(getenv("ORDER_ARCHIVE_AFTER_DAYS", 30))
+# Orders moved per transaction, so the write lock is only held briefly
+ORDER_ARCHIVE_BATCH_SIZE = int(getenv("ORDER_ARCHIVE_BATCH_SIZE", 500))
+# How often the server archives in the background; 0 leaves it to the CLI
+ORDER_ARCHIVE_INTERVAL_MINUTES = float(getenv("ORDER_ARCHIVE_INTERVAL_MINUTES", 60))
+
+# Hand order inserts and status updates to a single writer task that commits
+# whatever is pending in one transaction (group commit)
+ORDER_WRITE_PIPELINE = getenv("ORDER_WRITE_PIPELINE", "false").lower() == "true"
+# How long the writer waits for more jobs once one arrives; 0 takes only what is already queued
+ORDER_WRITE_BATCH_MS = float(getenv("ORDER_WRITE_BATCH_MS", 2))
+# Jobs committed together at most
+ORDER_WRITE_MAX_BATCH = int(getenv("ORDER_WRITE_MAX_BATCH", 200))
+
+
+def _rate_limit(name: str, default: str) -> tuple[float, int]:
+    rate, burst = getenv(name, default).split(",")
+    return float(rate), int(burst)
+
+
+# Token buckets limiting request rates, as (tokens refilled per second, bucket size),
+# set as "rate,burst", e.g. AUTH_RATE_LIMIT_PER_IP=2,30.
+# Set RATE_LIMITS=false to turn them off, e.g. for load tests.
+RATE_LIMITS = getenv("RATE_LIMITS", "true").lower() == "true"
+# Sign-ups and sign-ins per client address; generous, as a campus shares few addresses
+AUTH_RATE_LIMIT_PER_IP = _rate_limit("AUTH_RATE_LIMIT_PER_IP", "2,30")
+# Sign-in attempts per account, whatever address they come from
+SIGNIN_RATE_LIMIT_PER_ACCOUNT = _rate_limit("SIGNIN_RATE_LIMIT_PER_ACCOUNT", "0.2,5")
+# Orders placed per customer, and per client address
+ORDER_RATE_LIMIT_PER_USER = _rate_limit("ORDER_RATE_LIMIT_PER_USER", "0.5,5")
+ORDER_RATE_LIMIT_PER_IP = _rate_limit("ORDER_RATE_LIMIT_PER_IP", "10,100")
+# Clients tracked per limit; the least recently seen are forgotten first
+RATE_LIMIT_MAX_KEYS = int(getenv("RATE_LIMIT_MAX_KEYS", 100_000))
+# Comma-separated addresses or networks of the reverse proxies in front of the
+# app. Only a request coming from one of them has its X-Forwarded-For header
+# trusted for the client address; without any, the socket's peer address is used.
+TRUSTED_PROXIES = [network.strip() for network in getenv("TRUSTED_PROXIES", "").split(",")
+                   if network.strip()]
+
+# Orders a restaurant may have in its queue (pending or preparing) before new
+# ones are turned away with a Retry-After estimate; 0 for no cap
+MAX_ACTIVE_ORDERS_PER_RESTAURANT = int(getenv("MAX_ACTIVE_ORDERS_PER_RESTAURANT", 0))
+# How long a queue depth seen by this process is trusted to turn orders away
+KITCHEN_LOAD_TTL_SECONDS = float(getenv("KITCHEN_LOAD_TTL_SECONDS", 5))
+
+# Sales analytics of /restaurants/me/analytics
+ANALYTICS_DEFAULT_DAYS = 7
+ANALYTICS_TOP_FOODS = 10
+# Restaurants whose rollups are rebuilt per transaction by the backfill command
+ANALYTICS_REBUILD_BATCH_SIZE = int(getenv("ANALYTICS_REBUILD_BATCH_SIZE", 100))
+
+# Rows accepted by one bulk menu upload
+MENU_IMPORT_MAX_ROWS = int(getenv("MENU_IMPORT_MAX_ROWS", 1_000))
+# Characters one row of a bulk menu upload may take up, which bounds what is
+# buffered while a row has not been received in full
+MENU_IMPORT_MAX_ROW_LENGTH = int(getenv("MENU_IMPORT_MAX_ROW_LENGTH", 16_384))
+
+# Server-sent order event streams
+ORDER_STREAM_HEARTBEAT_SECONDS = 15
+# Events buffered per connection before the oldest ones are dropped
+ORDER_STREAM_QUEUE_SIZE = 100
+
+# Keyset pagination of list endpoints
+MAX_PAGE_SIZE = 100
+# Rows fetched per round trip when a list endpoint streams its response
+STREAM_BATCH_SIZE = 500
+
+# Verified tokens kept in memory so authentication can skip the JWT decode
+PRINCIPAL_CACHE_SIZE = 10_000
+PRINCIPAL_CACHE_TTL_SECONDS = 300
+
+# Serialized restaurant list pages and restaurant details kept in memory.
+# Writes invalidate them right away; the TTL only bounds staleness when
+# several server processes share one database.
+CATALOG_CACHE_SIZE = int(getenv("CATALOG_CACHE_SIZE", 1_000))
+CATALOG_CACHE_TTL_SECONDS = int(getenv("CATALOG_CACHE_TTL_SECONDS", 60))
+
+# Requests slower than this are logged with the SQL they issued; unset to disable
+SLOW_REQUEST_MS = int(getenv("SLOW_REQUEST_MS")) if getenv("SLOW_REQUEST_MS") else None
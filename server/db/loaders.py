@@ -0,0 +1,54 @@
+from sqlalchemy.orm import immediateload, joinedload, selectinload
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from server.db.models import ArchivedOrder, Customer, Order, Restaurant
+
+# Loader options matching each response schema, so relationships are fetched
+# with a fixed number of queries instead of one lazy load per row.
+
+# OrderPublic; the restaurant carries the queue statistics behind the estimates
+order_public_options = [joinedload(Order.food), joinedload(Order.restaurant)]
+
+# OrderPublic, for orders read from the archive
+archived_order_options = [joinedload(ArchivedOrder.food)]
+
+# RestaurantPublic
+restaurant_public_options = [selectinload(Restaurant.menu)]
+
+# RestaurantWithDetail
+restaurant_detail_options = [
+    selectinload(Restaurant.menu),
+    # Every order belongs to the restaurant being loaded, which is already
+    # in the identity map, so linking it back costs no query
+    selectinload(Restaurant.orders).options(
+        joinedload(Order.food), immediateload(Order.restaurant)),
+]
+
+# CustomerPublic
+customer_public_options = [
+    selectinload(Customer.orders).options(*order_public_options),
+    selectinload(Customer.liked_restaurants).selectinload(Restaurant.menu),
+]
+
+# Schema fields a model computes from a relationship the schema does not list;
+# a projection asking for them has to load that relationship too
+computed_field_relationships = {
+    Order: {"queue_position": ["restaurant"], "estimated_ready_at": ["restaurant"]},
+}
+
+
+async def reload(session: AsyncSession, instance: SQLModel, options: list) -> SQLModel:
+    """
+    Re-reads an already loaded object together with the given relationships.
+    This replaces `session.refresh`, which would leave every relationship to lazy loading,
+    and lazy loading is not available on an async session.
+    """
+    model = type(instance)
+    query = (
+        select(model)
+        .where(model.id == instance.id)
+        .options(*options)
+        .execution_options(populate_existing=True)
+    )
+    return (await session.exec(query)).one()
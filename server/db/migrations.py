@@ -0,0 +1,179 @@
+"""
+Versioned, in-place schema upgrades.
+
+`SQLModel.metadata.create_all` only creates missing tables; it never adds
+columns or indexes to tables that already exist. Each migration below brings
+an existing database one step closer to the current models, and the version
+reached is stored in the `schema_version` table.
+
+Migrations must be idempotent: on a fresh database `create_all` has already
+built the latest schema and every step is a no-op.
+
+On startup `create_all` only runs while the stored version is behind `head()`,
+so a change to the models, a new table included, always needs a migration.
+
+    python -m server.db.migrations            # upgrade the configured database
+    python -m server.db.migrations --current  # print the stored version
+"""
+import argparse
+import logging
+from typing import Callable
+from sqlalchemy import Connection, Engine, inspect, text
+from sqlmodel import SQLModel
+
+logger = logging.getLogger(__name__)
+
+Migration = Callable[[Connection], None]
+
+# version -> (description, upgrade function), applied in ascending order
+migrations: dict[int, tuple[str, Migration]] = {}
+
+
+def migration(version: int, description: str):
+    def register(fn: Migration) -> Migration:
+        migrations[version] = (description, fn)
+        return fn
+    return register
+
+
+def add_column(conn: Connection, table: str, column: str, ddl: str, backfill: str | None = None) -> None:
+    """Adds a column unless it exists, optionally filling existing rows with a SQL expression."""
+    if column in {c["name"] for c in inspect(conn).get_columns(table)}:
+        return
+    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+    if backfill is not None:
+        conn.execute(text(f"UPDATE {table} SET {column} = {backfill}"))
+
+
+def create_indexes(conn: Connection, *tables: str) -> None:
+    """Creates the indexes declared on the models of the given tables, if missing."""
+    for table in tables:
+        for index in SQLModel.metadata.tables[table].indexes:
+            index.create(conn, checkfirst=True)
+
+
+@migration(1, "Version markers for change feeds and conditional GETs")
+def _version_markers(conn: Connection) -> None:
+    add_column(conn, "orders", "updated_at", "DATETIME", backfill="created_at")
+    add_column(conn, "restaurants", "updated_at", "DATETIME", backfill="created_at")
+    add_column(conn, "restaurants", "version", "INTEGER NOT NULL DEFAULT 0")
+    add_column(conn, "customers", "version", "INTEGER NOT NULL DEFAULT 0")
+
+
+@migration(2, "Indexes for order, menu, like and pagination lookups")
+def _access_path_indexes(conn: Connection) -> None:
+    create_indexes(conn, "orders", "foods", "customerrestaurantlink",
+                   "customers", "restaurants")
+
+
+@migration(3, "Quantity of an order line")
+def _order_quantity(conn: Connection) -> None:
+    add_column(conn, "orders", "quantity", "INTEGER NOT NULL DEFAULT 1")
+
+
+@migration(4, "Status timestamps and queue statistics for wait-time estimates")
+def _wait_time_statistics(conn: Connection) -> None:
+    for column in ("preparing_at", "ready_at", "delivered_at", "cancelled_at"):
+        add_column(conn, "orders", column, "DATETIME")
+    queued = "status IN ('pending', 'preparing')"
+    # Orders already in a queue get tickets in the order they were placed
+    add_column(conn, "orders", "queue_ticket", "INTEGER", backfill=f"""
+        CASE WHEN {queued} THEN (
+            SELECT COUNT(*) FROM orders AS earlier
+            WHERE earlier.restaurant_id = orders.restaurant_id
+            AND earlier.{queued} AND earlier.created_at <= orders.created_at
+        ) END""")
+
+    depth = f"(SELECT COUNT(*) FROM orders WHERE orders.restaurant_id = restaurants.id AND orders.{queued})"
+    add_column(conn, "restaurants", "queue_depth", "INTEGER NOT NULL DEFAULT 0", backfill=depth)
+    add_column(conn, "restaurants", "orders_placed", "INTEGER NOT NULL DEFAULT 0", backfill=depth)
+    add_column(conn, "restaurants", "orders_served", "INTEGER NOT NULL DEFAULT 0")
+    add_column(conn, "restaurants", "prep_seconds_ewma", "FLOAT")
+    add_column(conn, "restaurants", "queue_depth_ewma", "FLOAT")
+    add_column(conn, "restaurants", "queue_updated_at", "DATETIME")
+
+
+@migration(5, "Index for finding orders due for archival")
+def _archive_index(conn: Connection) -> None:
+    # The archive table itself is new, so `create_all` has already built it
+    create_indexes(conn, "orders")
+
+
+@migration(6, "Full-text index over menus")
+def _menu_search_index(conn: Connection) -> None:
+    # Imported here: the search service depends on the models, not the other way round
+    from server.services.search import create_search_index
+
+    create_search_index(conn)
+
+
+@migration(7, "Hourly sales rollups")
+def _sales_rollups(conn: Connection) -> None:
+    # The table is new, so `create_all` has built it empty; fill it from the existing orders
+    from server.services.analytics import rebuild_batch
+
+    rebuild_batch(conn)
+
+
+@migration(8, "Menu items can be removed without losing their orders")
+def _removable_foods(conn: Connection) -> None:
+    add_column(conn, "foods", "removed_at", "DATETIME")
+
+
+def head() -> int:
+    return max(migrations)
+
+
+def current_version(conn: Connection) -> int:
+    if not inspect(conn).has_table("schema_version"):
+        return 0
+    return conn.execute(text("SELECT version FROM schema_version")).scalar() or 0
+
+
+def _store_version(conn: Connection, version: int) -> None:
+    conn.execute(text("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)"))
+    conn.execute(text("DELETE FROM schema_version"))
+    conn.execute(text("INSERT INTO schema_version (version) VALUES (:version)"),
+                 {"version": version})
+
+
+def upgrade(engine: Engine) -> int:
+    """
+    Applies every pending migration, each in its own transaction,
+    and returns the resulting schema version.
+    """
+    with engine.connect() as conn:
+        version = current_version(conn)
+
+    for target in sorted(v for v in migrations if v > version):
+        description, fn = migrations[target]
+        with engine.begin() as conn:
+            fn(conn)
+            _store_version(conn, target)
+        logger.info("Applied migration %d: %s", target, description)
+        version = target
+
+    return version
+
+
+def main():
+    # Imported here so importing this module does not create engines
+    from server.db.session import engine
+
+    parser = argparse.ArgumentParser(description="Upgrade the database schema in place.")
+    parser.add_argument("--current", action="store_true", help="only print the stored version")
+    args = parser.parse_args()
+    # Show each migration as it is applied
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if args.current:
+        with engine.connect() as conn:
+            print(current_version(conn))
+        return
+
+    SQLModel.metadata.create_all(engine)
+    print(f"Schema at version {upgrade(engine)}")
+
+
+if __name__ == "__main__":
+    main()
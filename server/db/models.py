@@ -1,18 +1,29 @@
+from sqlalchemy import Index, inspect
 from sqlmodel import Field, Relationship, SQLModel
 from pydantic import EmailStr
-from datetime import datetime
+from datetime import datetime, timedelta
 from uuid import UUID, uuid4
 
-from server.db.schemas import FoodBase, OrderBase, OrderStatus
+from server.db.schemas import FoodBase, OrderBase, OrderStatus, QUEUED_ORDER_STATUSES
 
 
 class CustomerRestaurantLink(SQLModel, table=True):
+    # The primary key serves "restaurants liked by a customer";
+    # this index serves the reverse direction
+    __table_args__ = (
+        Index("ix_link_restaurant_customer", "restaurant_id", "customer_id"),
+    )
+
     customer_id: UUID = Field(foreign_key="customers.id", primary_key=True)
     restaurant_id: UUID = Field(foreign_key="restaurants.id", primary_key=True)
 
 
 class Customer(SQLModel, table=True):
     __tablename__ = "customers"
+    __table_args__ = (
+        # Keyset pagination of /customers/
+        Index("ix_customers_created_at_id", "created_at", "id"),
+    )
 
     id: UUID = Field(default_factory=uuid4, primary_key=True)
     username: str = Field(unique=True)
@@ -24,10 +35,16 @@ class Customer(SQLModel, table=True):
         link_model=CustomerRestaurantLink
     )
     created_at: datetime = Field(default_factory=datetime.now)
+    # Bumped on every change to the data served by /customers/me (orders, likes)
+    version: int = 0
 
 
 class Restaurant(SQLModel, table=True):
     __tablename__ = "restaurants"
+    __table_args__ = (
+        # Keyset pagination of /restaurants/
+        Index("ix_restaurants_created_at_id", "created_at", "id"),
+    )
 
     id: UUID = Field(default_factory=uuid4, primary_key=True)
     username: str = Field(unique=True)
@@ -40,26 +57,151 @@ class Restaurant(SQLModel, table=True):
         back_populates="liked_restaurants",
         link_model=CustomerRestaurantLink
     )
-    menu: list["Food"] = Relationship()
+    # Removed foods stay in `foods` for the orders that reference them
+    menu: list["Food"] = Relationship(sa_relationship_kwargs={
+        "primaryjoin": "and_(Restaurant.id == Food.restaurant_id, Food.removed_at == None)",
+        "viewonly": True,
+    })
     created_at: datetime = Field(default_factory=datetime.now)
+    # Bumped when the public profile or the menu changes
+    updated_at: datetime = Field(default_factory=datetime.now)
+    # Bumped on every change to the data served by /restaurants/me (profile, menu, orders)
+    version: int = 0
+
+    # Rolling kitchen statistics, maintained in O(1) by services/wait_times.py.
+    # Orders waiting for the kitchen (pending or preparing)
+    queue_depth: int = 0
+    # Queue tickets handed out, and orders that have left the queue since
+    orders_placed: int = 0
+    orders_served: int = 0
+    # EWMAs of the pending -> ready time and of the queue depth new orders see
+    prep_seconds_ewma: float | None = None
+    queue_depth_ewma: float | None = None
+    # When an order last joined or left the queue
+    queue_updated_at: datetime | None = None
+
+    def seconds_per_order(self) -> float:
+        """
+        Kitchen time per order ahead in the queue. By Little's law the
+        throughput is the queue depth over the time spent in it; until
+        orders have been observed, the hand-set average wait time is used.
+        """
+        if not self.prep_seconds_ewma:
+            return self.avg_wait_time * 60
+        return self.prep_seconds_ewma / max(self.queue_depth_ewma or 1, 1)
 
 
 class Food(FoodBase, table=True):
     __tablename__ = "foods"
 
     id: UUID = Field(default_factory=uuid4, primary_key=True)
-    restaurant_id: UUID = Field(foreign_key="restaurants.id")
+    restaurant_id: UUID = Field(foreign_key="restaurants.id", index=True)
+    # Set when the food is taken off the menu; past orders keep pointing at it
+    removed_at: datetime | None = None
 
 
-class Order(OrderBase, table=True):
-    __tablename__ = "orders"
-
+# Columns shared by live orders and archived ones
+class OrderRecord(OrderBase):
     id: UUID = Field(default_factory=uuid4, primary_key=True)
     customer_id: UUID = Field(foreign_key="customers.id")
-    customer: Customer | None = Relationship(back_populates="orders")
     food_id: UUID = Field(foreign_key="foods.id")
-    food: Food = Relationship()
     restaurant_id: UUID = Field(foreign_key="restaurants.id")
-    restaurant: Restaurant | None = Relationship(back_populates="orders")
     status: OrderStatus = Field(default=OrderStatus.pending.value)
     created_at: datetime = Field(default_factory=datetime.now)
+    # Bumped on every status change so pollers can ask for "changed since"
+    updated_at: datetime = Field(default_factory=datetime.now)
+    # When the order entered each status
+    preparing_at: datetime | None = None
+    ready_at: datetime | None = None
+    delivered_at: datetime | None = None
+    cancelled_at: datetime | None = None
+    # Place in the restaurant's queue, counted from `Restaurant.orders_placed`
+    queue_ticket: int | None = None
+
+
+class Order(OrderRecord, table=True):
+    __tablename__ = "orders"
+    __table_args__ = (
+        # Active orders of a restaurant, newest first
+        Index("ix_orders_restaurant_status_created", "restaurant_id", "status", "created_at"),
+        # Orders of a restaurant changed since a cursor
+        Index("ix_orders_restaurant_updated", "restaurant_id", "updated_at"),
+        # Order history of a customer
+        Index("ix_orders_customer_created", "customer_id", "created_at"),
+        # Terminal orders due for archival
+        Index("ix_orders_status_updated", "status", "updated_at"),
+    )
+
+    customer: Customer | None = Relationship(back_populates="orders")
+    food: Food = Relationship()
+    restaurant: Restaurant | None = Relationship(back_populates="orders")
+
+    def _queue(self) -> Restaurant | None:
+        # Estimates need the restaurant's statistics, but must never trigger a lazy load
+        if "restaurant" in inspect(self).unloaded or self.queue_ticket is None:
+            return None
+        return self.restaurant
+
+    @property
+    def queue_position(self) -> int | None:
+        """Orders ahead of this one plus itself, assuming the kitchen works first in, first out."""
+        if self.status == OrderStatus.ready:
+            return 0
+        restaurant = self._queue()
+        if self.status not in QUEUED_ORDER_STATUSES or restaurant is None:
+            return None
+        return max(self.queue_ticket - restaurant.orders_served, 1)
+
+    @property
+    def estimated_ready_at(self) -> datetime | None:
+        if self.status == OrderStatus.ready:
+            return self.ready_at
+        position = self.queue_position
+        if not position:
+            return None
+        # Anchored to the last queue movement, so the estimate only changes when the queue does
+        restaurant = self.restaurant
+        anchor = max(self.created_at, restaurant.queue_updated_at or self.created_at)
+        return anchor + timedelta(seconds=position * restaurant.seconds_per_order())
+
+
+# Delivered and cancelled orders moved out of `orders` by services/archive.py,
+# so the relationships of restaurants and customers only load recent orders
+class ArchivedOrder(OrderRecord, table=True):
+    __tablename__ = "orders_archive"
+    __table_args__ = (
+        # Order history of a restaurant or a customer, newest first
+        Index("ix_orders_archive_restaurant_created", "restaurant_id", "created_at"),
+        Index("ix_orders_archive_customer_created", "customer_id", "created_at"),
+    )
+
+    food: Food = Relationship()
+    archived_at: datetime = Field(default_factory=datetime.now)
+
+    # Archived orders have left every queue long ago
+    @property
+    def queue_position(self) -> None:
+        return None
+
+    @property
+    def estimated_ready_at(self) -> None:
+        return None
+
+
+# Sales of one food in one hour, kept up to date by services/analytics.py as
+# orders are placed and finished, so reports never scan the order history.
+# Orders count towards the hour they were placed in.
+class OrderRollup(SQLModel, table=True):
+    __tablename__ = "order_rollups"
+
+    restaurant_id: UUID = Field(foreign_key="restaurants.id", primary_key=True)
+    hour: datetime = Field(primary_key=True)
+    # No foreign key: the sales of a food outlive its removal from the menu
+    food_id: UUID = Field(primary_key=True)
+    orders: int = 0
+    items: int = 0
+    # Menu price times quantity, at the time the order was placed or cancelled
+    revenue: float = 0
+    delivered: int = 0
+    cancelled: int = 0
+    cancelled_revenue: float = 0
@@ -0,0 +1,83 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+
+class QueryCounter:
+    """Collects the SQL statements issued while it is active."""
+
+    def __init__(self):
+        self.statements: list[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+
+# Counters of the blocks the current context is in, innermost last
+_active: ContextVar[tuple[QueryCounter, ...]] = ContextVar("query_counters", default=())
+
+
+def _record(conn, cursor, statement, parameters, context, executemany):
+    for counter in _active.get():
+        counter.statements.append(statement)
+
+
+def _app_engines() -> list:
+    # Imported here so importing this module does not create engines
+    from server.db import session
+
+    return [session.engine, session.read_engine, session.async_engine, session.async_read_engine]
+
+
+def _watch(engine: Engine | AsyncEngine) -> None:
+    # Cursor events of an async engine fire on the sync engine it wraps
+    if isinstance(engine, AsyncEngine):
+        engine = engine.sync_engine
+    if not event.contains(engine, "before_cursor_execute", _record):
+        event.listen(engine, "before_cursor_execute", _record)
+
+
+@contextmanager
+def count_queries(*engines: Engine | AsyncEngine):
+    """
+    Counts the queries issued through `engines`, all of the app's by default,
+    by the current task and by what it hands work to: the threads of the
+    sync fallback and the jobs of the write pipeline carry its context along.
+    Requests sent concurrently from other tasks are not counted, so every
+    task can count its own.
+
+    Example:
+        async with asgi_client(app) as client:
+            with count_queries() as counter:
+                await client.get("/restaurants/")
+        print(counter.count)
+    """
+    for engine in engines or _app_engines():
+        if engine is not None:
+            _watch(engine)
+
+    counter = QueryCounter()
+    token = _active.set((*_active.get(), counter))
+    try:
+        yield counter
+    finally:
+        _active.reset(token)
+
+
+@contextmanager
+def assert_max_queries(max_queries: int, *engines: Engine | AsyncEngine):
+    """
+    Fails if the block issues more than `max_queries` queries.
+    Use it to pin an endpoint's query budget so N+1 regressions are caught
+    regardless of how many rows the database holds.
+    """
+    with count_queries(*engines) as counter:
+        yield counter
+
+    if counter.count > max_queries:
+        statements = "\n".join(counter.statements)
+        raise AssertionError(
+            f"Expected at most {max_queries} queries, got {counter.count}:\n{statements}")
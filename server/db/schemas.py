@@ -1,9 +1,10 @@
 from datetime import datetime
 from enum import Enum
 import re
+from typing import Annotated
 from uuid import UUID
 from pydantic import BaseModel, EmailStr, field_validator
-from sqlmodel import SQLModel
+from sqlmodel import Field, SQLModel
 
 
 class UserCreate(SQLModel):
@@ -40,11 +41,33 @@ class LikedRestaurantUpdate(SQLModel):
     restaurant_id: UUID
 
 
+# Desired state of one heart; the last change for a restaurant wins
+class LikedRestaurantChange(SQLModel):
+    restaurant_id: UUID
+    liked: bool
+
+
+class LikedRestaurantsSync(SQLModel):
+    changes: list[LikedRestaurantChange] = Field(min_length=1, max_length=100)
+
+
+class LikedRestaurantStatus(SQLModel):
+    restaurant_id: UUID
+    liked: bool
+
+
 class UserType(str, Enum):
     customer = "CUSTOMER"
     restaurant = "RESTAURANT"
 
 
+# Lightweight snapshot of an authenticated user, enough for ownership checks
+class Principal(SQLModel):
+    id: UUID
+    role: UserType
+    username: str
+
+
 class FoodBase(SQLModel):
     title: str
     price: float
@@ -55,11 +78,66 @@ class FoodPublic(FoodBase):
     id: UUID
 
 
+class FoodSearchResult(FoodPublic):
+    restaurant_id: UUID
+    restaurant_name: str
+
+
 class FoodCreate(FoodBase):
     """This class was created to improve readability when defining API routes"""
     pass
 
 
+class FoodUpdate(SQLModel):
+    # Partial update of a menu item: only the fields sent are changed
+    title: str | None = None
+    price: float | None = None
+    image: str | None = None
+
+    # Defaults are not validated, so this only catches an explicit null
+    @field_validator("title", "price", "image")
+    @classmethod
+    def reject_null(cls, value):
+        if value is None:
+            raise ValueError("Leave the field out instead of sending null.")
+        return value
+
+
+# One row of a bulk menu upload. Rows with an id update that food; rows
+# without one update the food with the same title, or add a new one.
+class MenuImportRow(FoodBase):
+    id: UUID | None = None
+
+
+class MenuImportAction(str, Enum):
+    created = "created"
+    updated = "updated"
+    unchanged = "unchanged"
+    deleted = "deleted"
+    rejected = "rejected"
+
+
+class MenuImportResult(SQLModel):
+    # Position of the row in the upload, counted from 1; empty for foods
+    # deleted because the upload no longer lists them
+    row: int | None
+    action: MenuImportAction
+    id: UUID | None = None
+    title: str | None = None
+    error: str | None = None
+
+
+class MenuImportReport(SQLModel):
+    # Nothing is applied when a row is rejected or on a dry run
+    applied: bool
+    created: int
+    updated: int
+    unchanged: int
+    deleted: int
+    rejected: int
+    rows: list[MenuImportResult]
+
+
 class RestaurantUpdate(SQLModel):
     # Both fields are optional to allow for partial updates.
     # Setting the default to None ensures validation passes when a client
@@ -88,6 +166,7 @@ class OrderBase(SQLModel):
     customer_id: UUID
     restaurant_id: UUID
     food_id: UUID
+    quantity: int = Field(default=1, ge=1)
     status: OrderStatus
 
 
@@ -95,6 +174,31 @@ class OrderPublic(OrderBase):
     id: UUID
     food: FoodPublic
     created_at: datetime
+    updated_at: datetime
+    # Live estimates from the restaurant's queue; empty once the order is delivered or cancelled
+    queue_position: int | None = None
+    estimated_ready_at: datetime | None = None
+
+
+# Orders the kitchen is still working on, i.e. the restaurant's queue
+QUEUED_ORDER_STATUSES = [
+    OrderStatus.pending,
+    OrderStatus.preparing,
+]
+
+# Orders that still need the kitchen's attention
+ACTIVE_ORDER_STATUSES = [
+    OrderStatus.pending,
+    OrderStatus.preparing,
+    OrderStatus.ready,
+]
+
+
+# Response of the restaurant dashboard's order feed.
+# `cursor` should be sent back as `since` on the next poll.
+class RestaurantOrders(SQLModel):
+    orders: list[OrderPublic]
+    cursor: datetime
 
 
 # Public schema for restaurant's itself
@@ -105,6 +209,39 @@ class RestaurantWithDetail(RestaurantPublic):
     created_at: datetime
 
 
+class SalesFigures(SQLModel):
+    orders: int
+    items: int
+    # Value of the orders placed, and of those of them later cancelled
+    revenue: float
+    cancelled_revenue: float
+    delivered: int
+    cancelled: int
+
+
+class HourlySales(SalesFigures):
+    hour: datetime
+
+
+class FoodSales(SalesFigures):
+    food_id: UUID
+    # Empty if the food no longer exists at all
+    title: str | None
+
+
+class SalesTotals(SalesFigures):
+    cancellation_rate: float
+
+
+# Response of the restaurant dashboard's analytics, served from hourly rollups
+class RestaurantAnalytics(SQLModel):
+    start: datetime
+    end: datetime
+    totals: SalesTotals
+    hourly: list[HourlySales]
+    top_foods: list[FoodSales]
+
+
 class CustomerPublic(SQLModel):
     id: UUID
     username: str
@@ -113,10 +250,27 @@ class CustomerPublic(SQLModel):
     liked_restaurants: list[RestaurantPublic]
 
 
+# Items of one food a single order may ask for
+OrderQuantity = Annotated[int, Field(ge=1, le=20)]
+
+
 class OrderCreate(OrderBase):
+    quantity: OrderQuantity = 1
     status: OrderStatus = OrderStatus.pending.value
 
 
+class CartLine(SQLModel):
+    food_id: UUID
+    quantity: OrderQuantity = 1
+
+
+# A whole cart checked out at once; every line becomes one order
+class OrderBatchCreate(SQLModel):
+    customer_id: UUID
+    restaurant_id: UUID
+    lines: list[CartLine] = Field(min_length=1, max_length=50)
+
+
 class OrderUpdate(SQLModel):
     status: OrderStatus | None
 
@@ -1,14 +1,176 @@
+import logging
+from contextlib import asynccontextmanager
+from importlib.util import find_spec
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel import SQLModel, create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.concurrency import run_in_threadpool
 from server.db.models import CustomerRestaurantLink, Customer, Restaurant, Order, Food
-from server.config import DATABASE_URL
+from server.db.migrations import current_version, head, upgrade
+from server.config import (
+    ASYNC_DATABASE, DATABASE_URL, DB_ENGINE_PROFILE, DB_READ_POOL_SIZE, SQLITE_PRAGMAS,
+)
 
-engine = create_engine(DATABASE_URL)
+logger = logging.getLogger(__name__)
 
+# Async drivers for the databases we run on, by dialect; each is named after its module
+ASYNC_DRIVERS = {
+    "sqlite": "aiosqlite",
+    "postgresql": "asyncpg",
+}
 
-def get_session():
-    with Session(engine) as session:
+
+def to_async_url(url: str) -> str | None:
+    """
+    Swaps the driver of a database URL for its async counterpart, or returns
+    None if the dialect has none or it is not installed.
+    """
+    scheme, rest = url.split("://", 1)
+    dialect = scheme.split("+")[0]
+    driver = ASYNC_DRIVERS.get(dialect)
+    if driver is None or find_spec(driver) is None:
+        return None
+    return f"{dialect}+{driver}://{rest}"
+
+
+def _set_pragmas(pragmas: dict):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+    return on_connect
+
+
+def _create_engines(url: str, factory) -> tuple:
+    """
+    Creates the writer and reader engines for a database URL.
+
+    With the engine profile on, the writer holds a single connection, so
+    mutations queue up in-process rather than fighting over SQLite's lock,
+    and a pool of query-only connections serves reads next to it.
+    """
+    if not DB_ENGINE_PROFILE:
+        engine = factory(url)
+        return engine, engine
+
+    writer = factory(url, pool_size=1, max_overflow=0)
+    reader = factory(url, pool_size=DB_READ_POOL_SIZE, max_overflow=0)
+
+    if url.startswith("sqlite") and ":memory:" not in url:
+        for target, pragmas in (
+            (writer, SQLITE_PRAGMAS),
+            (reader, {**SQLITE_PRAGMAS, "query_only": "ON"}),
+        ):
+            # Connect events of an async engine fire on the sync engine it wraps
+            sync_engine = getattr(target, "sync_engine", target)
+            event.listen(sync_engine, "connect", _set_pragmas(pragmas))
+
+    return writer, reader
+
+
+# The sync engines are always available for startup tasks and scripts
+engine, read_engine = _create_engines(DATABASE_URL, create_engine)
+
+async_url = to_async_url(DATABASE_URL) if ASYNC_DATABASE else None
+if ASYNC_DATABASE and async_url is None:
+    logger.warning("No async driver installed for %s; serving requests through the sync engine",
+                   engine.dialect.name)
+# Requests are served through the async engines if they exist, or else the sync ones
+async_engine, async_read_engine = (
+    _create_engines(async_url, create_async_engine) if async_url else (None, None)
+)
+
+
+class SyncSessionAdapter:
+    """
+    Gives a sync Session the awaitable interface of AsyncSession by running
+    each database call in the threadpool. Routes are written once against
+    the async interface and keep working when ASYNC_DATABASE is off or the
+    async driver is not installed.
+    """
+
+    def __init__(self, session: Session):
+        self.sync_session = session
+
+    async def exec(self, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.exec, *args, **kwargs)
+
+    async def get(self, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.get, *args, **kwargs)
+
+    async def scalar(self, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.scalar, *args, **kwargs)
+
+    async def refresh(self, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.refresh, *args, **kwargs)
+
+    async def flush(self, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.flush, *args, **kwargs)
+
+    async def delete(self, instance):
+        return await run_in_threadpool(self.sync_session.delete, instance)
+
+    async def commit(self):
+        return await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self):
+        return await run_in_threadpool(self.sync_session.rollback)
+
+    async def close(self):
+        return await run_in_threadpool(self.sync_session.close)
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return await run_in_threadpool(fn, self.sync_session, *args, **kwargs)
+
+    def __getattr__(self, name):
+        # Non-blocking methods such as add() and expunge_all() are the same in both modes
+        return getattr(self.sync_session, name)
+
+
+# Requests with these methods never write, so they are served by the reader engine
+READ_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+@asynccontextmanager
+async def open_session(read_only: bool = False):
+    """
+    Opens a session outside of dependency injection, for routes that only
+    need the database when they cannot answer from memory.
+    """
+    # Objects stay usable after commit; with an async session an expired
+    # attribute could not be reloaded lazily while the response is serialized
+    if async_engine is not None:
+        bind = async_read_engine if read_only else async_engine
+        async with AsyncSession(bind, expire_on_commit=False) as session:
+            yield session
+    else:
+        bind = read_engine if read_only else engine
+        with Session(bind, expire_on_commit=False) as session:
+            yield SyncSessionAdapter(session)
+
+
+async def get_session(request: Request):
+    async with open_session(read_only=request.method in READ_METHODS) as session:
         yield session
 
 
+async def dispose_engines():
+    """Closes pooled connections; aiosqlite keeps a thread alive for each one."""
+    for target in {async_engine, async_read_engine} - {None}:
+        await target.dispose()
+    for target in {engine, read_engine}:
+        target.dispose()
+
+
 def create_db_and_tables():
+    # A database at the latest version is complete, so skip reflecting every table
+    with engine.connect() as conn:
+        if current_version(conn) == head():
+            return
+
+    # New tables come from the models; existing ones are upgraded by the migrations
     SQLModel.metadata.create_all(engine)
+    upgrade(engine)
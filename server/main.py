@@ -1,19 +1,34 @@
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from server.api.routes import restaurants, customers, orders, auth
-from server.config import CLIENT_URL
-from server.db.session import create_db_and_tables
+from fastapi.responses import ORJSONResponse, PlainTextResponse
+from server.api.routes import restaurants, customers, orders, auth, foods
+from server.config import CLIENT_URL, ORDER_ARCHIVE_INTERVAL_MINUTES
+from server.db import session
+from server.db.session import create_db_and_tables, dispose_engines
+from server.services.archive import archive_periodically
+from server.services.metrics import MetricsMiddleware, instrument_engine, registry
+from server.services.write_pipeline import write_pipeline
+from server.utils.passwords import password_hasher
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Handles application startup and shutdown events."""
     create_db_and_tables()
+    archiver = (asyncio.create_task(archive_periodically(session.engine))
+                if ORDER_ARCHIVE_INTERVAL_MINUTES > 0 else None)
     yield
+    if archiver:
+        archiver.cancel()
+    await write_pipeline.close()
+    password_hasher.shutdown()
+    await dispose_engines()
 
-# Initialize the FastAPI app
-app = FastAPI(lifespan=lifespan)
+# Initialize the FastAPI app.
+# Responses are rendered with orjson; routes returning `model_response` skip rendering altogether.
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # Configure CORS middleware for FastAPI to allow credentials, etc.
 app.add_middleware(
@@ -22,10 +37,23 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+# Added last so it wraps everything else and times the whole request
+app.add_middleware(MetricsMiddleware)
+for engine in {session.engine, session.read_engine, session.async_engine, session.async_read_engine} - {None}:
+    instrument_engine(engine)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Exposes request and database metrics in the Prometheus text format."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 # Include all the REST API routers
 app.include_router(restaurants.router)
 app.include_router(customers.router)
 app.include_router(orders.router)
+app.include_router(foods.router)
 app.include_router(auth.router)
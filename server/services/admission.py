@@ -0,0 +1,163 @@
+"""
+Admission control: turns requests away before they reach the database.
+
+Token buckets limit how often a client may sign in or place orders, keyed by
+client address, account or user. A restaurant whose queue is full turns new
+orders away with an estimate of when it will have room again. Every check is
+a dictionary lookup in this process, and every rejection is counted in
+`admission_rejections_total`.
+"""
+from collections import OrderedDict
+from ipaddress import ip_address, ip_network
+from threading import Lock
+from time import monotonic
+from typing import Hashable
+from uuid import UUID
+from fastapi import Depends, Request
+
+from server.config import (
+    AUTH_RATE_LIMIT_PER_IP, KITCHEN_LOAD_TTL_SECONDS, MAX_ACTIVE_ORDERS_PER_RESTAURANT,
+    ORDER_RATE_LIMIT_PER_IP, ORDER_RATE_LIMIT_PER_USER, RATE_LIMIT_MAX_KEYS, RATE_LIMITS,
+    SIGNIN_RATE_LIMIT_PER_ACCOUNT, TRUSTED_PROXIES,
+)
+from server.db.models import Restaurant
+from server.db.schemas import Principal
+from server.services.metrics import Counter, registry
+from server.utils.auth import authenticate_principal
+from server.utils.cache import TTLCache
+from server.utils.exceptions import kitchen_at_capacity, too_many_requests
+
+rejections = registry.register(Counter(
+    "admission_rejections_total", "Requests turned away by a rate limit or a full kitchen", ("limit",)))
+
+
+class RateLimiter:
+    """
+    A token bucket per key. Each bucket holds up to `burst` tokens and
+    refills at `rate` tokens per second; a request takes one token.
+    Once `max_keys` buckets exist, the least recently used one is dropped,
+    which only forgets a client that has been quiet the longest.
+    """
+
+    def __init__(self, name: str, rate: float, burst: int, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        # key -> (tokens left, when they were counted)
+        self._buckets: OrderedDict[Hashable, tuple[float, float]] = OrderedDict()
+        self._lock = Lock()
+
+    def acquire(self, key: Hashable) -> float:
+        """Takes a token; returns 0 if there was one, or else the seconds until there is."""
+        now = monotonic()
+        with self._lock:
+            tokens, counted_at = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - counted_at) * self.rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def check(self, key: Hashable) -> None:
+        """Raises a 429 with `Retry-After` if the key has run out of tokens."""
+        if not RATE_LIMITS:
+            return
+        if wait := self.acquire(key):
+            rejections.inc(self.name)
+            raise too_many_requests(wait)
+
+
+auth_ip_limiter = RateLimiter("auth_ip", *AUTH_RATE_LIMIT_PER_IP)
+signin_account_limiter = RateLimiter("signin_account", *SIGNIN_RATE_LIMIT_PER_ACCOUNT)
+order_ip_limiter = RateLimiter("order_ip", *ORDER_RATE_LIMIT_PER_IP)
+order_user_limiter = RateLimiter("order_user", *ORDER_RATE_LIMIT_PER_USER)
+
+
+trusted_proxies = [ip_network(network, strict=False) for network in TRUSTED_PROXIES]
+
+
+def _is_trusted_proxy(address: str) -> bool:
+    try:
+        address = ip_address(address)
+    except ValueError:
+        return False
+    return any(address in network for network in trusted_proxies)
+
+
+def client_address(request: Request) -> str:
+    """
+    The address rate limits are keyed by. Behind trusted proxies, it is the
+    last X-Forwarded-For hop that is not a trusted proxy itself: the ones
+    before it were written by the client and could be anything.
+    """
+    address = request.client.host if request.client else "unknown"
+    if not _is_trusted_proxy(address):
+        return address
+    forwarded = ",".join(request.headers.getlist("x-forwarded-for")).split(",")
+    for hop in reversed(forwarded):
+        if hop := hop.strip():
+            address = hop
+            if not _is_trusted_proxy(hop):
+                break
+    return address
+
+
+def limit_by_ip(limiter: RateLimiter):
+    """A route dependency that takes a token from the client address's bucket."""
+    async def check(request: Request) -> None:
+        limiter.check(client_address(request))
+    return Depends(check)
+
+
+def limit_by_user(limiter: RateLimiter):
+    """A route dependency that takes a token from the authenticated user's bucket."""
+    # Shares the route's own authentication, which FastAPI runs once per request
+    async def check(current: Principal = Depends(authenticate_principal)) -> None:
+        limiter.check(current.id)
+    return Depends(check)
+
+
+class KitchenLoads:
+    """
+    The queue depth and pace of each restaurant as last seen by this
+    process, so a full kitchen turns orders away without a query. Entries
+    expire quickly: writes by other processes, or a transaction that was
+    rolled back, must not keep a restaurant closed. Placing an order still
+    checks the queue in its own transaction.
+    """
+
+    def __init__(self, cap: int, ttl: float):
+        self.cap = cap
+        # restaurant id -> (queue depth, seconds per order)
+        self._loads = TTLCache(max_size=RATE_LIMIT_MAX_KEYS, ttl=ttl)
+
+    def remember(self, restaurant: Restaurant) -> None:
+        if self.cap:
+            self._loads.set(restaurant.id, (restaurant.queue_depth, restaurant.seconds_per_order()))
+
+    def _reject(self, depth: int, seconds_per_order: float, count: int) -> None:
+        excess = depth + count - self.cap
+        if excess > 0:
+            rejections.inc("kitchen_capacity")
+            # Until enough orders ahead have left the queue
+            raise kitchen_at_capacity(excess * seconds_per_order)
+
+    def check(self, restaurant_id: UUID, count: int) -> None:
+        """Turns `count` new orders away if the restaurant's queue was last seen full."""
+        if self.cap and (load := self._loads.get(restaurant_id)):
+            self._reject(*load, count)
+
+    def admit(self, restaurant: Restaurant, count: int) -> None:
+        """The same check against the restaurant as loaded in the ordering transaction."""
+        if self.cap:
+            self.remember(restaurant)
+            self._reject(restaurant.queue_depth, restaurant.seconds_per_order(), count)
+
+
+kitchen_loads = KitchenLoads(cap=MAX_ACTIVE_ORDERS_PER_RESTAURANT, ttl=KITCHEN_LOAD_TTL_SECONDS)
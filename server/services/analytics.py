@@ -0,0 +1,188 @@
+"""
+Hourly sales rollups behind /restaurants/me/analytics.
+
+Placing an order adds to the rollup of its (restaurant, hour, food), and
+delivering or cancelling it updates the same row, in the transaction of the
+change. A report then reads a few rows per hour and food instead of the
+whole order history. To rebuild the rollups from the orders, e.g. after
+importing data, run from the repository root:
+
+    python -m server.services.analytics --rebuild
+"""
+import argparse
+from collections import defaultdict
+from datetime import datetime
+from uuid import UUID
+from sqlalchemy import Connection, Engine, case, delete, func, insert, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from server.config import ANALYTICS_REBUILD_BATCH_SIZE, ANALYTICS_TOP_FOODS
+from server.db.models import ArchivedOrder, Food, Order, OrderRollup, Restaurant
+from server.db.schemas import FoodSales, HourlySales, OrderStatus, RestaurantAnalytics, SalesTotals
+
+COUNTERS = ["orders", "items", "revenue", "delivered", "cancelled", "cancelled_revenue"]
+ROLLUP_KEY = ["restaurant_id", "hour", "food_id"]
+
+# Statuses an order is counted in once it reaches them
+TERMINAL_COUNTERS = {OrderStatus.delivered: "delivered", OrderStatus.cancelled: "cancelled"}
+
+# INSERT ... ON CONFLICT DO UPDATE of the databases we run on
+UPSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+
+def hour_of(moment: datetime) -> datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def as_local(moment: datetime) -> datetime:
+    """Converts a timezone-aware time to naive local time, the form orders and rollups are stored in."""
+    if moment.tzinfo is None:
+        return moment
+    return moment.astimezone().replace(tzinfo=None)
+
+
+async def _add(session: AsyncSession, rows: list[dict]) -> None:
+    """Adds the counters of each row to its rollup, which is created if missing."""
+    statement = UPSERTS[session.bind.dialect.name](OrderRollup).values(rows)
+    await session.exec(statement.on_conflict_do_update(
+        index_elements=ROLLUP_KEY,
+        # Subscripted: `excluded.items` would be the collection's items() method
+        set_={name: getattr(OrderRollup, name) + statement.excluded[name]
+              for name in COUNTERS},
+    ))
+
+
+async def record_orders_placed(session: AsyncSession, orders: list[Order], menu: dict[UUID, Food]) -> None:
+    rows = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+    for order in orders:
+        row = rows[(order.restaurant_id, hour_of(order.created_at), order.food_id)]
+        row["orders"] += 1
+        row["items"] += order.quantity
+        row["revenue"] += order.quantity * menu[order.food_id].price
+    # One statement for the whole cart
+    await _add(session, [dict(zip(ROLLUP_KEY, key), **counters) for key, counters in rows.items()])
+
+
+async def record_status_change(session: AsyncSession, order: Order, previous: OrderStatus) -> None:
+    """Counts the order in or out of the delivered and cancelled totals; `order.food` must be loaded."""
+    counters = dict.fromkeys(COUNTERS, 0)
+    for status, name in TERMINAL_COUNTERS.items():
+        counters[name] = (order.status == status) - (previous == status)
+    if not any(counters.values()):
+        return
+    counters["cancelled_revenue"] = counters["cancelled"] * order.quantity * order.food.price
+    await _add(session, [{"restaurant_id": order.restaurant_id, "hour": hour_of(order.created_at),
+                          "food_id": order.food_id, **counters}])
+
+
+async def sales_report(session: AsyncSession, restaurant_id: UUID,
+                       start: datetime, end: datetime) -> RestaurantAnalytics:
+    """Totals, hourly figures and best-selling foods of the hours from `start` up to `end`."""
+    in_range = (
+        OrderRollup.restaurant_id == restaurant_id,
+        OrderRollup.hour >= hour_of(start),
+        OrderRollup.hour < end,
+    )
+    sums = [func.sum(getattr(OrderRollup, name)).label(name) for name in COUNTERS]
+
+    hourly = (await session.exec(
+        select(OrderRollup.hour, *sums).where(*in_range)
+        .group_by(OrderRollup.hour).order_by(OrderRollup.hour)
+    )).all()
+    top_foods = (await session.exec(
+        select(OrderRollup.food_id, Food.title, *sums)
+        .outerjoin(Food, Food.id == OrderRollup.food_id)
+        .where(*in_range)
+        .group_by(OrderRollup.food_id, Food.title)
+        .order_by(func.sum(OrderRollup.items).desc(), OrderRollup.food_id)
+        .limit(ANALYTICS_TOP_FOODS)
+    )).all()
+
+    totals = {name: sum(getattr(row, name) for row in hourly) for name in COUNTERS}
+    return RestaurantAnalytics(
+        start=start,
+        end=end,
+        totals=SalesTotals(
+            **totals,
+            cancellation_rate=totals["cancelled"] / totals["orders"] if totals["orders"] else 0,
+        ),
+        hourly=[HourlySales.model_validate(row) for row in hourly],
+        top_foods=[FoodSales.model_validate(row) for row in top_foods],
+    )
+
+
+def _hour_bucket(column, dialect: str):
+    if dialect == "sqlite":
+        # The text format SQLAlchemy stores datetimes in, so rows match the incremental ones
+        return func.strftime("%Y-%m-%d %H:00:00.000000", column)
+    return func.date_trunc("hour", column)
+
+
+def rebuild_batch(conn: Connection, restaurant_ids: list[UUID] | None = None) -> None:
+    """Recomputes the rollups of the given restaurants, or of all, from live and archived orders."""
+    def orders_of(model):
+        query = select(model.restaurant_id, model.food_id, model.quantity, model.status, model.created_at)
+        return query if restaurant_ids is None else query.where(model.restaurant_id.in_(restaurant_ids))
+
+    source = union_all(orders_of(Order), orders_of(ArchivedOrder)).subquery()
+    hour = _hour_bucket(source.c.created_at, conn.dialect.name)
+    # Foods deleted outright no longer have a price
+    value = source.c.quantity * func.coalesce(Food.price, 0)
+    cancelled = source.c.status == OrderStatus.cancelled
+    rollups = (
+        select(
+            source.c.restaurant_id, hour, source.c.food_id,
+            func.count(), func.sum(source.c.quantity), func.sum(value),
+            func.sum(case((source.c.status == OrderStatus.delivered, 1), else_=0)),
+            func.sum(case((cancelled, 1), else_=0)),
+            func.sum(case((cancelled, value), else_=0)),
+        )
+        .select_from(source)
+        .outerjoin(Food, Food.id == source.c.food_id)
+        .group_by(source.c.restaurant_id, hour, source.c.food_id)
+    )
+
+    stale = delete(OrderRollup)
+    if restaurant_ids is not None:
+        stale = stale.where(OrderRollup.restaurant_id.in_(restaurant_ids))
+    conn.execute(stale)
+    conn.execute(insert(OrderRollup).from_select([*ROLLUP_KEY, *COUNTERS], rollups))
+
+
+def rebuild_rollups(engine: Engine, batch_size: int = ANALYTICS_REBUILD_BATCH_SIZE) -> int:
+    """Rebuilds the rollups of every restaurant, one batch of restaurants per transaction; returns how many."""
+    total, last = 0, None
+    while True:
+        with engine.begin() as conn:
+            query = select(Restaurant.id).order_by(Restaurant.id).limit(batch_size)
+            if last is not None:
+                query = query.where(Restaurant.id > last)
+            ids = conn.execute(query).scalars().all()
+            if ids:
+                rebuild_batch(conn, ids)
+        total += len(ids)
+        if len(ids) < batch_size:
+            return total
+        last = ids[-1]
+
+
+def main():
+    # Imported here so importing this module does not create engines
+    from server.db.session import create_db_and_tables, engine
+
+    parser = argparse.ArgumentParser(description="Maintain the hourly sales rollups.")
+    parser.add_argument("--rebuild", action="store_true", help="recompute every rollup from the orders")
+    parser.add_argument("--batch-size", type=int, default=ANALYTICS_REBUILD_BATCH_SIZE,
+                        help="restaurants per transaction")
+    args = parser.parse_args()
+
+    # Creates the rollup table on a database the server has not been started on
+    create_db_and_tables()
+    if args.rebuild:
+        print(f"Rebuilt the rollups of {rebuild_rollups(engine, args.batch_size)} restaurants")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Moves delivered and cancelled orders into `orders_archive`.
+
+Orders are moved in small batches, each in its own short transaction, so
+request handlers waiting for the write lock are never held up for long.
+Runs periodically inside the server (see ORDER_ARCHIVE_INTERVAL_MINUTES) or
+on demand, from the repository root:
+
+    python -m server.services.archive --older-than-days 30
+"""
+import argparse
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from time import sleep
+from sqlalchemy import Engine, delete, insert, select, update
+from starlette.concurrency import run_in_threadpool
+
+from server.config import (
+    ORDER_ARCHIVE_AFTER_DAYS, ORDER_ARCHIVE_BATCH_SIZE, ORDER_ARCHIVE_INTERVAL_MINUTES,
+)
+from server.db.models import ArchivedOrder, Customer, Order, OrderRecord, Restaurant
+from server.db.schemas import OrderStatus
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_ORDER_STATUSES = [OrderStatus.delivered, OrderStatus.cancelled]
+
+# Every column both tables share, copied as is
+ARCHIVED_COLUMNS = list(OrderRecord.model_fields)
+
+# Pause between batches, so waiting writers can take the lock
+BATCH_PAUSE_SECONDS = 0.05
+
+
+def archive_batch(engine: Engine, cutoff: datetime, batch_size: int) -> int:
+    """Moves up to `batch_size` terminal orders last changed before `cutoff`; returns how many."""
+    with engine.begin() as conn:
+        batch = conn.execute(
+            select(Order.id, Order.restaurant_id, Order.customer_id)
+            .where(Order.status.in_(TERMINAL_ORDER_STATUSES), Order.updated_at < cutoff)
+            .limit(batch_size)
+        ).all()
+        if not batch:
+            return 0
+
+        ids = [row.id for row in batch]
+        conn.execute(insert(ArchivedOrder).from_select(
+            ARCHIVED_COLUMNS,
+            select(*(getattr(Order, column) for column in ARCHIVED_COLUMNS)).where(Order.id.in_(ids)),
+        ))
+        conn.execute(delete(Order).where(Order.id.in_(ids)))
+
+        # The detailed views of the owners no longer list these orders
+        conn.execute(update(Restaurant)
+                     .where(Restaurant.id.in_({row.restaurant_id for row in batch}))
+                     .values(version=Restaurant.version + 1))
+        conn.execute(update(Customer)
+                     .where(Customer.id.in_({row.customer_id for row in batch}))
+                     .values(version=Customer.version + 1))
+    return len(batch)
+
+
+def archive_orders(engine: Engine, older_than: timedelta = timedelta(days=ORDER_ARCHIVE_AFTER_DAYS),
+                   batch_size: int = ORDER_ARCHIVE_BATCH_SIZE) -> int:
+    """Archives every terminal order older than `older_than`, batch by batch; returns how many."""
+    cutoff = datetime.now() - older_than
+    total = 0
+    while moved := archive_batch(engine, cutoff, batch_size):
+        total += moved
+        if moved < batch_size:
+            break
+        sleep(BATCH_PAUSE_SECONDS)
+    return total
+
+
+async def archive_periodically(engine: Engine) -> None:
+    """Background task of the server; cancelled on shutdown."""
+    while True:
+        try:
+            moved = await run_in_threadpool(archive_orders, engine)
+            if moved:
+                logger.info("Archived %d orders", moved)
+        except Exception:
+            # A failed run is retried on the next interval
+            logger.exception("Archiving orders failed")
+        await asyncio.sleep(ORDER_ARCHIVE_INTERVAL_MINUTES * 60)
+
+
+def main():
+    # Imported here so importing this module does not create engines
+    from server.db.session import create_db_and_tables, engine
+
+    parser = argparse.ArgumentParser(description="Archive delivered and cancelled orders.")
+    parser.add_argument("--older-than-days", type=float, default=ORDER_ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--batch-size", type=int, default=ORDER_ARCHIVE_BATCH_SIZE)
+    args = parser.parse_args()
+
+    # The archive table may not exist yet on a database the server has not been started on
+    create_db_and_tables()
+    moved = archive_orders(engine, timedelta(days=args.older_than_days), args.batch_size)
+    print(f"Archived {moved} orders")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,22 @@
 from server.db.models import Customer, Restaurant
-from sqlmodel import Session
+from sqlmodel import update
+from sqlmodel.ext.asyncio.session import AsyncSession
 from server.db.schemas import (
     SigninData, UserCreate, UserType
 )
 from server.utils.auth import (
     create_access_token, get_user_by_email,
     hash_password, verify_password,
-    model_map, schema_map
+    model_map, options_map, schema_map
 )
+from server.db.loaders import reload
+from server.db.session import open_session
+from server.services.catalog import catalog_cache
+from server.utils.passwords import needs_rehash
 from server.utils.exceptions import incorrect_email_or_password, validation_error
 
 
-def signup_user(data: UserCreate, user_role: UserType, session: Session):
+async def signup_user(data: UserCreate, user_role: UserType, session: AsyncSession):
     """
     Creates a new user, hashes their password, and stores them in the database.
 
@@ -34,7 +39,7 @@ def signup_user(data: UserCreate, user_role: UserType, session: Session):
     user_data = {
         "username": data.username,
         "email": data.email,
-        "password": hash_password(data.password),
+        "password": await hash_password(data.password),
     }
     if user_role == UserType.restaurant.value:
         user_data["restaurant_name"] = data.restaurant_name
@@ -44,8 +49,14 @@ def signup_user(data: UserCreate, user_role: UserType, session: Session):
 
     # Add new user to the database
     session.add(user)
-    session.commit()
-    session.refresh(user)
+    await session.commit()
+
+    # A new restaurant shows up in the public catalog
+    if user_role == UserType.restaurant.value:
+        catalog_cache.invalidate(user.id)
+
+    # A new user has no orders or likes yet, but the public schema still reads them
+    user = await reload(session, user, options_map[user_role])
 
     # Generate a JWT access token for the new user
     token = create_access_token(user_id=user.id, role=user_role)
@@ -58,7 +69,7 @@ def signup_user(data: UserCreate, user_role: UserType, session: Session):
     }
 
 
-def signin_user(data: SigninData, user_role: UserType, session: Session):
+async def signin_user(data: SigninData, user_role: UserType, session: AsyncSession):
     """
     Authenticates a user by verifying their email and password.
 
@@ -74,21 +85,35 @@ def signin_user(data: SigninData, user_role: UserType, session: Session):
     Raises:
         HTTPException: If the user is not found or the password is incorrect.
     """
-    # Get user from database by given email and role
-    user = get_user_by_email(
-        session=session, email=data.email, model=model_map.get(user_role.value))
+    model = model_map[user_role.value]
+    # Read through the reader engine and give the connection back before the
+    # password is checked: the writer engine holds a single connection, and
+    # keeping it through a bcrypt hash would queue every write behind sign-ins
+    async with open_session(read_only=True) as reader:
+        user = await get_user_by_email(session=reader, email=data.email, model=model)
 
     # If user exists, verify the provided password against the stored hash
-    if user and verify_password(plain_password=data.password, hashed_password=user.password):
+    if user and await verify_password(plain_password=data.password, hashed_password=user.password):
         # Generate JWT access token upon successful authentication
         token = create_access_token(user_id=user.id, role=user_role)
 
-        # Return access token and user data (based on role)
-        return {
-            "access_token": token,
-            "token_type": "bearer",
-            "user": schema_map[user_role].model_validate(user)
-        }
+        # Upgrade hashes made with an outdated bcrypt cost while the plain password is at hand.
+        # Hashed first, so the write transaction only lasts for the UPDATE
+        if needs_rehash(user.password):
+            password = await hash_password(data.password)
+            await session.exec(update(model).where(model.id == user.id).values(password=password))
+            await session.commit()
+
+        # Load the relationships of the public schema in a fixed number of queries
+        async with open_session(read_only=True) as reader:
+            user = await reload(reader, user, options_map[user_role])
+
+            # Return access token and user data (based on role)
+            return {
+                "access_token": token,
+                "token_type": "bearer",
+                "user": schema_map[user_role].model_validate(user)
+            }
 
     # Raise exception if user not found or password is incorrect
     raise incorrect_email_or_password
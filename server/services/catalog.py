@@ -0,0 +1,101 @@
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+from threading import Lock
+from typing import Hashable
+from uuid import UUID
+
+from server.config import CATALOG_CACHE_SIZE, CATALOG_CACHE_TTL_SECONDS
+from server.db.schemas import RestaurantPublic
+from server.services.metrics import Counter, Gauge, registry
+from server.utils.cache import TTLCache
+from server.utils.etag import not_modified
+
+restaurant_list_adapter = TypeAdapter(list[RestaurantPublic])
+
+
+class CachedJSON:
+    """A response body serialized once, with the headers that go along with it."""
+
+    def __init__(self, body: bytes, etag: str, headers: dict[str, str] | None = None):
+        self.body = body
+        self.etag = etag
+        self.headers = headers or {}
+
+    def to_response(self, request: Request) -> Response:
+        response = Response(content=self.body, media_type="application/json",
+                            headers=self.headers)
+        return not_modified(request, response, self.etag) or response
+
+
+class CatalogCache:
+    """
+    Holds the public restaurant catalog as ready-to-send JSON, so a hit is
+    answered without opening a database session.
+
+    List pages depend on every restaurant, so any change drops all of them;
+    a detail only depends on its own restaurant. Writers invalidate after
+    committing. A reader that started before an invalidation does not store
+    its result, since it may have read the data as it was before the write.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self._lists = TTLCache(max_size=max_size, ttl=ttl)
+        self._details = TTLCache(max_size=max_size, ttl=ttl)
+        self._generation = 0
+        self._lock = Lock()
+
+    @property
+    def generation(self) -> int:
+        """Take this before reading from the database and pass it to `set_*`."""
+        return self._generation
+
+    def get_list(self, key: Hashable) -> CachedJSON | None:
+        return self._lists.get(key)
+
+    def set_list(self, key: Hashable, entry: CachedJSON, generation: int) -> None:
+        with self._lock:
+            if generation == self._generation:
+                self._lists.set(key, entry)
+
+    def get_detail(self, restaurant_id: UUID) -> CachedJSON | None:
+        return self._details.get(restaurant_id)
+
+    def set_detail(self, restaurant_id: UUID, entry: CachedJSON, generation: int) -> None:
+        with self._lock:
+            if generation == self._generation:
+                self._details.set(restaurant_id, entry)
+
+    def invalidate(self, restaurant_id: UUID) -> None:
+        """Drops everything a public change of the restaurant can affect."""
+        with self._lock:
+            self._generation += 1
+            self._lists.clear()
+            self._details.pop(restaurant_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._lists.clear()
+            self._details.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self._lists.hits + self._details.hits,
+            "misses": self._lists.misses + self._details.misses,
+            "size": len(self._lists) + len(self._details),
+        }
+
+
+catalog_cache = CatalogCache(max_size=CATALOG_CACHE_SIZE, ttl=CATALOG_CACHE_TTL_SECONDS)
+
+
+@registry.collector
+def catalog_cache_metrics():
+    stats = catalog_cache.stats()
+    hits = Counter("catalog_cache_hits_total", "Catalog responses served from memory")
+    misses = Counter("catalog_cache_misses_total", "Catalog responses built from the database")
+    size = Gauge("catalog_cache_entries", "Serialized catalog responses held in memory")
+    hits.set(value=stats["hits"])
+    misses.set(value=stats["misses"])
+    size.set(value=stats["size"])
+    return [hits, misses, size]
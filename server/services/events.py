@@ -0,0 +1,104 @@
+import asyncio
+from collections import defaultdict
+from threading import Lock
+from uuid import UUID
+
+from server.config import ORDER_STREAM_QUEUE_SIZE
+from server.db.schemas import OrderPublic
+
+
+class Subscription:
+    """
+    A single listener of the order event bus, bound to the event loop it was created on.
+    Events are queued as pre-serialized JSON so every listener shares the same payload.
+    """
+
+    def __init__(self, bus: "OrderEventBus", topics: list[str], max_size: int):
+        self.bus = bus
+        self.topics = topics
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue[str] = asyncio.Queue(maxsize=max_size)
+        self.dropped = 0
+
+    def put(self, payload: str) -> None:
+        # A slow client must never block publishers. Each event is a full snapshot
+        # of the order, so dropping the oldest pending one loses nothing but history.
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(payload)
+
+    async def get(self) -> str:
+        return await self.queue.get()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.bus.unsubscribe(self)
+
+
+class OrderEventBus:
+    """
+    In-process publish/subscribe hub for order changes.
+    Routes publish after committing; streaming endpoints subscribe to the topics they serve.
+    Publishing is thread-safe, since sync routes run inside the threadpool.
+    """
+
+    def __init__(self, max_queue_size: int = ORDER_STREAM_QUEUE_SIZE):
+        self.max_queue_size = max_queue_size
+        self._subscribers: dict[str, set[Subscription]] = defaultdict(set)
+        self._lock = Lock()
+
+    def subscribe(self, *topics: str) -> Subscription:
+        """Registers a listener for the given topics. Must be called from a running event loop."""
+        subscription = Subscription(self, list(topics), self.max_queue_size)
+        with self._lock:
+            for topic in topics:
+                self._subscribers[topic].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            for topic in subscription.topics:
+                listeners = self._subscribers.get(topic)
+                if listeners is None:
+                    continue
+                listeners.discard(subscription)
+                if not listeners:
+                    del self._subscribers[topic]
+
+    def publish(self, order: OrderPublic) -> None:
+        """Delivers an order snapshot to everyone watching the order, its customer or its restaurant."""
+        topics = (
+            order_topic(order.id),
+            customer_topic(order.customer_id),
+            restaurant_topic(order.restaurant_id),
+        )
+        with self._lock:
+            listeners = set().union(*(self._subscribers.get(t, ()) for t in topics))
+        if not listeners:
+            return
+
+        payload = order.model_dump_json()
+        for subscription in listeners:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, payload)
+            except RuntimeError:
+                # The listener's event loop is gone (e.g. during shutdown)
+                self.unsubscribe(subscription)
+
+
+def order_topic(order_id: UUID) -> str:
+    return f"order:{order_id}"
+
+
+def customer_topic(customer_id: UUID) -> str:
+    return f"customer:{customer_id}"
+
+
+def restaurant_topic(restaurant_id: UUID) -> str:
+    return f"restaurant:{restaurant_id}"
+
+
+order_events = OrderEventBus()
@@ -0,0 +1,167 @@
+"""
+Bulk menu uploads behind /restaurants/me/menu/import.
+
+An upload lists a restaurant's whole menu, as a JSON array of foods or a CSV
+file with a `title,price,image` header and an optional `id` column. It is
+parsed and validated row by row as it arrives. Each row is then matched to a
+food on the menu, by id if it has one and by title otherwise, and the
+differences are applied with one INSERT, one UPDATE by primary key and one
+statement taking the foods the upload no longer lists off the menu.
+"""
+from collections import defaultdict
+from datetime import datetime
+from uuid import UUID, uuid4
+from fastapi import Request
+from pydantic import ValidationError
+from sqlalchemy import insert, update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from server.config import MENU_IMPORT_MAX_ROW_LENGTH, MENU_IMPORT_MAX_ROWS
+from server.db.models import Food
+from server.db.schemas import MenuImportAction, MenuImportReport, MenuImportResult, MenuImportRow
+from server.utils.exceptions import unsupported_upload_type, upload_too_large
+from server.utils.uploads import iter_csv_records, iter_json_array
+
+UPLOAD_PARSERS = {"application/json": iter_json_array, "text/csv": iter_csv_records}
+
+EDITABLE_FIELDS = ["title", "price", "image"]
+
+
+def _title_key(title: str) -> str:
+    return title.strip().casefold()
+
+
+def _describe(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(map(str, e['loc']))}: {e['msg']}" if e["loc"] else e["msg"]
+        for e in error.errors())
+
+
+class MenuImport:
+    """The rows of an upload, diffed against the current menu of a restaurant."""
+
+    def __init__(self):
+        # A validated row, or why it was rejected
+        self.rows: list[MenuImportRow | str] = []
+        self.inserts: list[dict] = []
+        self.updates: list[dict] = []
+        self.removals: list[UUID] = []
+
+    async def read(self, request: Request) -> None:
+        """Parses and validates the request body as it is received."""
+        media_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+        if media_type not in UPLOAD_PARSERS:
+            raise unsupported_upload_type
+        parse = UPLOAD_PARSERS[media_type]
+        async for record in parse(request.stream(), max_length=MENU_IMPORT_MAX_ROW_LENGTH):
+            self.add(record)
+
+    def add(self, record: object) -> None:
+        if len(self.rows) >= MENU_IMPORT_MAX_ROWS:
+            raise upload_too_large
+        if isinstance(record, dict) and None in record:
+            self.rows.append("More values than columns")
+            return
+        try:
+            self.rows.append(MenuImportRow.model_validate(record))
+        except ValidationError as error:
+            self.rows.append(_describe(error))
+
+    def _match(self, menu: list[Food]) -> list[Food | str | None]:
+        """The food each row updates, None for new ones, or why the row was rejected."""
+        by_id = {food.id: food for food in menu}
+        by_title = defaultdict(list)
+        for food in menu:
+            by_title[_title_key(food.title)].append(food)
+
+        targets: list[Food | str | None] = list(self.rows)
+        claimed: dict[UUID, int] = {}
+        # Rows naming their food by id claim it first, so row order does not matter
+        for number, row in enumerate(self.rows, 1):
+            if isinstance(row, str) or row.id is None:
+                continue
+            food = by_id.get(row.id)
+            if food is None:
+                targets[number - 1] = "Not on this restaurant's menu"
+            elif food.id in claimed:
+                targets[number - 1] = f"Same food as row {claimed[food.id]}"
+            else:
+                claimed[food.id] = number
+                targets[number - 1] = food
+
+        titled: dict[str, int] = {}
+        for number, row in enumerate(self.rows, 1):
+            if isinstance(row, str) or row.id is not None:
+                continue
+            key = _title_key(row.title)
+            if key in titled:
+                targets[number - 1] = f"Same title as row {titled[key]}"
+                continue
+            titled[key] = number
+            food = next((food for food in by_title[key] if food.id not in claimed), None)
+            if food is not None:
+                claimed[food.id] = number
+            targets[number - 1] = food
+        return targets
+
+    def diff(self, menu: list[Food], delete_missing: bool = True) -> MenuImportReport:
+        """Works out the changes that turn `menu` into the upload, and reports them per row."""
+        results = []
+        for number, (row, target) in enumerate(zip(self.rows, self._match(menu)), 1):
+            if isinstance(target, str):
+                valid = isinstance(row, MenuImportRow)
+                results.append(MenuImportResult(
+                    row=number, action=MenuImportAction.rejected, error=target,
+                    id=row.id if valid else None, title=row.title if valid else None))
+                continue
+            values = row.model_dump(include=set(EDITABLE_FIELDS))
+            if target is None:
+                food_id = uuid4()
+                self.inserts.append({"id": food_id, **values})
+                action = MenuImportAction.created
+            else:
+                food_id = target.id
+                changed = any(getattr(target, name) != value for name, value in values.items())
+                if changed:
+                    self.updates.append({"id": food_id, **values})
+                action = MenuImportAction.updated if changed else MenuImportAction.unchanged
+            results.append(MenuImportResult(row=number, action=action, id=food_id, title=row.title))
+
+        if delete_missing:
+            listed = {result.id for result in results if result.action != MenuImportAction.rejected}
+            for food in menu:
+                if food.id not in listed:
+                    self.removals.append(food.id)
+                    results.append(MenuImportResult(
+                        row=None, action=MenuImportAction.deleted, id=food.id, title=food.title))
+
+        counts = {action: 0 for action in MenuImportAction}
+        for result in results:
+            counts[result.action] += 1
+        return MenuImportReport(
+            applied=False,
+            rows=results,
+            **{action.value: count for action, count in counts.items()},
+        )
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.inserts or self.updates or self.removals)
+
+    async def apply(self, session: AsyncSession, restaurant_id: UUID) -> None:
+        """Writes the changes found by `diff` in the session's transaction."""
+        if self.inserts:
+            await session.exec(insert(Food), params=[
+                {**row, "restaurant_id": restaurant_id} for row in self.inserts])
+        if self.updates:
+            # Executed once per row by primary key, as a single statement
+            await session.exec(update(Food), params=self.updates)
+        if self.removals:
+            await session.exec(update(Food).where(Food.id.in_(self.removals))
+                               .values(removed_at=datetime.now()))
+
+
+async def current_menu(session: AsyncSession, restaurant_id: UUID) -> list[Food]:
+    return (await session.exec(select(Food).where(
+        Food.restaurant_id == restaurant_id, Food.removed_at.is_(None)))).all()
@@ -0,0 +1,232 @@
+import logging
+from bisect import bisect_left
+from contextvars import ContextVar
+from threading import Lock
+from time import perf_counter
+from typing import Callable, Iterable
+
+from sqlalchemy import event
+
+from server.config import SLOW_REQUEST_MS
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the latency histogram, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r'\"')
+
+
+def _format_labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """A monotonically increasing value per combination of label values."""
+
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: dict[tuple, float] = {}
+        self._lock = Lock()
+
+    def inc(self, *label_values, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def set(self, *label_values, value: float) -> None:
+        """For collectors that mirror a value kept elsewhere."""
+        with self._lock:
+            self._values[label_values] = value
+
+    def render(self) -> Iterable[str]:
+        with self._lock:
+            values = list(self._values.items())
+        for label_values, value in values:
+            yield f"{self.name}{_format_labels(self.labels, label_values)} {value}"
+
+
+class Gauge(Counter):
+    """A value that can go up and down."""
+
+    type = "gauge"
+
+    def dec(self, *label_values, amount: float = 1) -> None:
+        self.inc(*label_values, amount=-amount)
+
+
+class Histogram:
+    """Counts observations into cumulative buckets, as Prometheus expects them."""
+
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # Per label values: count of each bucket (plus +Inf), sum of observations
+        self._values: dict[tuple, tuple[list[int], float]] = {}
+        self._lock = Lock()
+
+    def observe(self, value: float, *label_values) -> None:
+        with self._lock:
+            counts, total = self._values.get(label_values, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect_left(self.buckets, value)] += 1
+            self._values[label_values] = (counts, total + value)
+
+    def render(self) -> Iterable[str]:
+        with self._lock:
+            values = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        for label_values, counts, total in values:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                labels = _format_labels(self.labels, label_values, f'le="{bound}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labels, label_values)
+            yield f"{self.name}_sum{labels} {total}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class Registry:
+    """
+    Holds the application's metrics and renders them in the Prometheus text format.
+    Collectors are called at scrape time, for values that live elsewhere.
+    """
+
+    def __init__(self):
+        self._metrics: list[Counter | Histogram] = []
+        self._collectors: list[Callable[[], Iterable[Gauge]]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, fn: Callable[[], Iterable[Gauge]]):
+        self._collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        metrics = [*self._metrics]
+        for collect in self._collectors:
+            metrics.extend(collect())
+
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+requests_total = registry.register(Counter(
+    "http_requests_total", "Requests served", ("method", "route", "status")))
+request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "Time spent serving a request", ("method", "route")))
+requests_in_flight = registry.register(Gauge(
+    "http_requests_in_flight", "Requests being served right now"))
+db_queries_total = registry.register(Counter(
+    "db_queries_total", "SQL statements issued while serving requests", ("method", "route")))
+db_duration_total = registry.register(Counter(
+    "db_query_duration_seconds_total", "Time spent in SQL while serving requests", ("method", "route")))
+
+
+class RequestStats:
+    """Database work done on behalf of the current request."""
+
+    def __init__(self, keep_statements: bool = False):
+        self.queries = 0
+        self.db_time = 0.0
+        self.statements: list[tuple[str, float]] | None = [] if keep_statements else None
+
+
+current_request: ContextVar[RequestStats | None] = ContextVar("current_request", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = perf_counter() - conn.info["query_started"].pop()
+    stats = current_request.get()
+    if stats is None:
+        return
+    stats.queries += 1
+    stats.db_time += elapsed
+    if stats.statements is not None:
+        stats.statements.append((statement, elapsed))
+
+
+def instrument_engine(engine) -> None:
+    """Attributes every statement the engine runs to the request that issued it."""
+    # Cursor events of an async engine fire on the sync engine it wraps.
+    # The context variable is visible there: SQLAlchemy runs the sync side
+    # in a greenlet that shares the task's context, and the sync fallback
+    # copies it into the threadpool.
+    engine = getattr(engine, "sync_engine", engine)
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class MetricsMiddleware:
+    """
+    Times every HTTP request and records it under its route template, so
+    `/orders/1` and `/orders/2` share one series. Requests slower than
+    SLOW_REQUEST_MS are logged together with the SQL they issued.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        stats = RequestStats(keep_statements=SLOW_REQUEST_MS is not None)
+        token = current_request.set(stats)
+        requests_in_flight.inc()
+        started = perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = perf_counter() - started
+            requests_in_flight.dec()
+            current_request.reset(token)
+
+            # The router stores the matched route in the scope
+            route = getattr(scope.get("route"), "path", "unmatched")
+            method = scope["method"]
+            requests_total.inc(method, route, status)
+            request_duration.observe(elapsed, method, route)
+            db_queries_total.inc(method, route, amount=stats.queries)
+            db_duration_total.inc(method, route, amount=stats.db_time)
+
+            if SLOW_REQUEST_MS is not None and elapsed * 1000 >= SLOW_REQUEST_MS:
+                statements = "".join(
+                    f"\n  [{seconds * 1000:.1f} ms] {statement}"
+                    for statement, seconds in stats.statements)
+                logger.warning(
+                    "Slow request %s %s: %.1f ms, %d queries, %.1f ms in SQL%s",
+                    method, scope["path"], elapsed * 1000, stats.queries,
+                    stats.db_time * 1000, statements)
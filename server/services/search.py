@@ -0,0 +1,138 @@
+"""
+Full-text search over the menus of every restaurant.
+
+On SQLite, the titles of foods and the names of their restaurants are
+indexed in the FTS5 table `foods_fts`, whose rowids are those of `foods`.
+Triggers keep it in step with every insert, update and delete of a food and
+every renamed restaurant. Other databases fall back to a LIKE scan. To
+re-index existing data, e.g. after restoring a backup, run from the
+repository root:
+
+    python -m server.services.search --rebuild
+"""
+import argparse
+import re
+from sqlalchemy import Connection, Select, column, func, literal_column, or_, table, text
+from sqlmodel import select
+
+from server.db.models import Food, Restaurant
+
+FTS_TABLE = "foods_fts"
+
+foods_fts = table(FTS_TABLE, column("rowid"), column("title"), column("restaurant_name"))
+
+# A match on the title counts ten times as much as one on the restaurant's name
+TITLE_WEIGHT, RESTAURANT_WEIGHT = 10.0, 1.0
+
+SEARCH_INDEX_DDL = [
+    # Prefix indexes make "veg" or "wr" as cheap as a whole word
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, restaurant_name, prefix='2 3', tokenize='unicode61 remove_diacritics 2')""",
+    f"""CREATE TRIGGER IF NOT EXISTS foods_fts_insert AFTER INSERT ON foods BEGIN
+        INSERT INTO {FTS_TABLE} (rowid, title, restaurant_name)
+        SELECT new.rowid, new.title, restaurant_name FROM restaurants WHERE id = new.restaurant_id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS foods_fts_update AFTER UPDATE OF title, restaurant_id ON foods BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.rowid;
+        INSERT INTO {FTS_TABLE} (rowid, title, restaurant_name)
+        SELECT new.rowid, new.title, restaurant_name FROM restaurants WHERE id = new.restaurant_id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS foods_fts_delete AFTER DELETE ON foods BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.rowid;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS restaurants_fts_rename AFTER UPDATE OF restaurant_name ON restaurants BEGIN
+        UPDATE {FTS_TABLE} SET restaurant_name = new.restaurant_name
+        WHERE rowid IN (SELECT rowid FROM foods WHERE restaurant_id = new.id);
+    END""",
+]
+
+
+def supports_fts(conn: Connection) -> bool:
+    return conn.dialect.name == "sqlite"
+
+
+def create_search_index(conn: Connection) -> None:
+    """Creates the index and its triggers if missing, and fills it when just created."""
+    if not supports_fts(conn):
+        return
+    existed = conn.dialect.has_table(conn, FTS_TABLE)
+    for statement in SEARCH_INDEX_DDL:
+        conn.execute(text(statement))
+    if not existed:
+        rebuild_search_index(conn)
+
+
+def rebuild_search_index(conn: Connection) -> int:
+    """Re-indexes every food from scratch; returns how many were indexed."""
+    conn.execute(text(f"DELETE FROM {FTS_TABLE}"))
+    return conn.execute(text(f"""
+        INSERT INTO {FTS_TABLE} (rowid, title, restaurant_name)
+        SELECT foods.rowid, foods.title, restaurants.restaurant_name
+        FROM foods JOIN restaurants ON restaurants.id = foods.restaurant_id
+    """)).rowcount
+
+
+def search_terms(q: str) -> list[str]:
+    """Words of the query; punctuation and FTS5 operators are dropped."""
+    return re.findall(r"\w+", q.lower())
+
+
+def match_expression(terms: list[str]) -> str:
+    # Every word must match as a prefix, so "veggie wr" finds "Veggie wrap"
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def _results(min_price: float | None, max_price: float | None) -> Select:
+    query = select(
+        Food.id, Food.title, Food.price, Food.image, Food.restaurant_id, Restaurant.restaurant_name,
+    ).join(Restaurant, Restaurant.id == Food.restaurant_id).where(
+        # Removed foods stay indexed; the index only narrows down the candidates
+        Food.removed_at.is_(None))
+    if min_price is not None:
+        query = query.where(Food.price >= min_price)
+    if max_price is not None:
+        query = query.where(Food.price <= max_price)
+    return query
+
+
+def fts_search(terms: list[str], min_price: float | None = None,
+               max_price: float | None = None) -> Select:
+    """Foods matching every term, best match first."""
+    rank = func.bm25(literal_column(FTS_TABLE), TITLE_WEIGHT, RESTAURANT_WEIGHT)
+    return (
+        _results(min_price, max_price)
+        .join(foods_fts, foods_fts.c.rowid == literal_column("foods.rowid"))
+        .where(literal_column(FTS_TABLE).match(match_expression(terms)))
+        .order_by(rank, Food.id)
+    )
+
+
+def like_search(terms: list[str], min_price: float | None = None,
+                max_price: float | None = None) -> Select:
+    """Substring scan over every food; no ranking, so results come by title."""
+    query = _results(min_price, max_price)
+    for term in terms:
+        pattern = f"%{term}%"
+        query = query.where(or_(Food.title.ilike(pattern), Restaurant.restaurant_name.ilike(pattern)))
+    return query.order_by(Food.title, Food.id)
+
+
+def main():
+    # Imported here so importing this module does not create engines
+    from server.db.session import create_db_and_tables, engine
+
+    parser = argparse.ArgumentParser(description="Maintain the menu search index.")
+    parser.add_argument("--rebuild", action="store_true", help="re-index every food")
+    args = parser.parse_args()
+
+    # Creates the index on a database the server has not been started on
+    create_db_and_tables()
+    if args.rebuild:
+        with engine.begin() as conn:
+            if not supports_fts(conn):
+                parser.exit(message="Full-text search needs SQLite; nothing to rebuild\n")
+            print(f"Indexed {rebuild_search_index(conn)} foods")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+from datetime import datetime
+from sqlalchemy import func
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlmodel import update
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from server.config import WAIT_TIME_EWMA_ALPHA
+from server.db.models import Order, Restaurant
+from server.db.schemas import OrderStatus, QUEUED_ORDER_STATUSES
+
+# Column of `Order` that records when the order entered each status
+STATUS_TIMESTAMPS = {
+    OrderStatus.preparing: "preparing_at",
+    OrderStatus.ready: "ready_at",
+    OrderStatus.delivered: "delivered_at",
+    OrderStatus.cancelled: "cancelled_at",
+}
+
+# Columns read back after each update, so the loaded restaurant serves fresh estimates
+QUEUE_COLUMNS = [
+    Restaurant.version,
+    Restaurant.queue_depth,
+    Restaurant.orders_placed,
+    Restaurant.orders_served,
+    Restaurant.prep_seconds_ewma,
+    Restaurant.queue_depth_ewma,
+    Restaurant.queue_updated_at,
+]
+
+
+def _ewma(column, sample):
+    # NULL until the first sample, which then becomes the average
+    return func.coalesce(column + WAIT_TIME_EWMA_ALPHA * (sample - column), sample)
+
+
+async def _update_queue(session: AsyncSession, restaurant: Restaurant, values: dict) -> None:
+    # The arithmetic runs in SQL, so concurrent writers never lose an update
+    row = (await session.exec(
+        update(Restaurant)
+        .where(Restaurant.id == restaurant.id)
+        .values(**values)
+        .returning(*QUEUE_COLUMNS)
+        .execution_options(synchronize_session=False)
+    )).one()
+    for column, value in zip(QUEUE_COLUMNS, row):
+        set_committed_value(restaurant, column.key, value)
+
+
+async def queue_orders(session: AsyncSession, restaurant: Restaurant, count: int) -> int:
+    """
+    Makes room for `count` new orders in the restaurant's queue and returns
+    the first of their consecutive tickets. Also marks the restaurant's
+    detailed view as changed, like `bump_restaurant`.
+    """
+    depth = Restaurant.queue_depth + count
+    await _update_queue(session, restaurant, {
+        "version": Restaurant.version + 1,
+        "orders_placed": Restaurant.orders_placed + count,
+        "queue_depth": depth,
+        "queue_depth_ewma": _ewma(Restaurant.queue_depth_ewma, depth),
+        "queue_updated_at": datetime.now(),
+    })
+    return restaurant.orders_placed - count + 1
+
+
+async def order_status_changed(session: AsyncSession, order: Order, previous: OrderStatus) -> None:
+    """
+    Records when the order entered its new status and, if it joined or left
+    the queue, updates the restaurant's rolling statistics. `order.restaurant`
+    must be loaded. Also marks the restaurant's detailed view as changed.
+    """
+    now = datetime.now()
+    if order.status in STATUS_TIMESTAMPS:
+        setattr(order, STATUS_TIMESTAMPS[order.status], now)
+
+    values = {"version": Restaurant.version + 1}
+    was_queued = previous in QUEUED_ORDER_STATUSES
+    is_queued = order.status in QUEUED_ORDER_STATUSES
+
+    if was_queued and not is_queued:
+        values.update(
+            queue_depth=Restaurant.queue_depth - 1,
+            orders_served=Restaurant.orders_served + 1,
+            queue_updated_at=now,
+        )
+        if order.status == OrderStatus.ready:
+            waited = (now - order.created_at).total_seconds()
+            values["prep_seconds_ewma"] = _ewma(Restaurant.prep_seconds_ewma, waited)
+    elif is_queued and not was_queued:
+        # Sent back to the kitchen; it keeps its ticket
+        values.update(
+            queue_depth=Restaurant.queue_depth + 1,
+            orders_served=Restaurant.orders_served - 1,
+            queue_updated_at=now,
+        )
+
+    await _update_queue(session, order.restaurant, values)
@@ -0,0 +1,161 @@
+"""
+Single-writer pipeline for order mutations (group commit).
+
+With ORDER_WRITE_PIPELINE on, routes hand the database work of placing an
+order or changing its status to one writer task instead of committing on
+their own session. The writer takes every job that is pending, runs them
+one after the other in a single transaction and commits once, then resolves
+each caller's future with its job's result. Under load, one commit (and one
+turn of SQLite's write lock) is shared by many requests.
+
+A job is an async function of a session that must raise, if it is going to,
+before it changes anything: an HTTPException only fails its own caller and
+the rest of the batch is still committed. Any other error rolls the batch
+back and its jobs are retried one by one, each in its own transaction.
+
+Jobs run in the context of the request that submitted them, so the queries
+they issue count towards that request; the shared commit counts towards none.
+"""
+import asyncio
+from contextvars import Context, copy_context
+from typing import Awaitable, Callable, TypeVar
+from fastapi import HTTPException
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from server.config import ORDER_WRITE_BATCH_MS, ORDER_WRITE_MAX_BATCH, ORDER_WRITE_PIPELINE
+from server.db.session import open_session
+from server.services.metrics import Histogram, registry
+
+T = TypeVar("T")
+Job = Callable[[AsyncSession], Awaitable[T]]
+
+batch_sizes = registry.register(Histogram(
+    "write_pipeline_batch_size", "Jobs committed together by the order write pipeline",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 200)))
+
+
+class WritePipeline:
+    def __init__(self, batch_ms: float, max_batch: int):
+        self.batch_seconds = batch_ms / 1000
+        self.max_batch = max_batch
+        # One writer per event loop: its queue can only be awaited on that loop
+        self._writers: dict[asyncio.AbstractEventLoop, tuple[asyncio.Queue, asyncio.Task]] = {}
+
+    async def submit(self, job: Job[T]) -> T:
+        """Queues a job and waits until the transaction it ran in is committed."""
+        loop = asyncio.get_running_loop()
+        if loop not in self._writers:
+            # Started on first use, on the event loop serving requests, but in
+            # a context of its own rather than a copy of the first request's
+            queue = asyncio.Queue()
+            self._writers[loop] = queue, loop.create_task(self._run(queue), context=Context())
+        queue, _ = self._writers[loop]
+        future = loop.create_future()
+        queue.put_nowait((job, future, copy_context()))
+        return await future
+
+    async def _run(self, queue: asyncio.Queue) -> None:
+        while True:
+            batch = [await queue.get()]
+            if self.batch_seconds:
+                await asyncio.sleep(self.batch_seconds)
+            while len(batch) < self.max_batch and not queue.empty():
+                batch.append(queue.get_nowait())
+            # Callers that gave up in the meantime have nothing to write
+            batch = [entry for entry in batch if not entry[1].done()]
+            if not batch:
+                continue
+            batch_sizes.observe(len(batch))
+            try:
+                await self._commit_batch(batch)
+            except Exception as e:
+                # Opening or rolling back a session failed: fail this batch, keep the writer
+                for _, future, _ in batch:
+                    self._resolve(future, exception=e)
+
+    @staticmethod
+    async def _run_job(job: Job[T], session: AsyncSession, context: Context) -> T:
+        """Runs a job in the context of the request that submitted it."""
+        return await asyncio.create_task(job(session), context=context)
+
+    async def _commit_batch(self, batch: list) -> None:
+        done = []
+        async with open_session() as session:
+            for job, future, context in batch:
+                try:
+                    result = await self._run_job(job, session, context)
+                except HTTPException as e:
+                    # Rejected before writing anything, so the others are unaffected
+                    self._resolve(future, exception=e)
+                    continue
+                except Exception:
+                    await session.rollback()
+                    await self._commit_each(batch)
+                    return
+                done.append((future, result))
+
+            try:
+                await session.commit()
+            except Exception as e:
+                for future, _ in done:
+                    self._resolve(future, exception=e)
+                return
+
+        for future, result in done:
+            self._resolve(future, result=result)
+
+    async def _commit_each(self, batch: list) -> None:
+        """Fallback after a failed batch: one transaction per job, so only the faulty one fails."""
+        for job, future, context in batch:
+            if future.done():
+                continue
+            try:
+                async with open_session() as session:
+                    result = await self._run_job(job, session, context)
+                    await session.commit()
+            except Exception as e:
+                self._resolve(future, exception=e)
+            else:
+                self._resolve(future, result=result)
+
+    @staticmethod
+    def _resolve(future: asyncio.Future, result=None, exception: Exception | None = None) -> None:
+        if future.done():
+            return
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+
+    async def close(self) -> None:
+        """Stops the writer of the running event loop and cancels the jobs it had not started."""
+        if (writer := self._writers.pop(asyncio.get_running_loop(), None)) is None:
+            return
+        queue, task = writer
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        while not queue.empty():
+            _, future, _ = queue.get_nowait()
+            future.cancel()
+
+
+write_pipeline = WritePipeline(ORDER_WRITE_BATCH_MS, ORDER_WRITE_MAX_BATCH)
+
+
+async def run_write(session: AsyncSession, job: Job[T]) -> T:
+    """
+    Runs a job on the request's session and commits it, or hands it to the
+    write pipeline when that is enabled.
+    """
+    if not ORDER_WRITE_PIPELINE:
+        result = await job(session)
+        await session.commit()
+        return result
+
+    # With the engine profile on, the writer engine has a single connection:
+    # give back the one this session may hold, or the pipeline would wait for it
+    await session.close()
+    return await write_pipeline.submit(job)
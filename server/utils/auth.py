@@ -1,18 +1,23 @@
+from collections import OrderedDict
 from fastapi import Depends, Cookie, Request
-from jwt.exceptions import InvalidTokenError
-from passlib.context import CryptContext
 from datetime import datetime, timedelta
-from sqlmodel import Session, select
+from itertools import count
+from time import monotonic, time
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from uuid import UUID
-import jwt
 from .exceptions import invalid_credentials, user_not_found
 
+from server.db.loaders import customer_public_options, restaurant_detail_options
 from server.db.models import Restaurant, Customer
-from server.db.schemas import CustomerPublic, RestaurantWithDetail, UserType
-from server.config import ACCESS_TOKEN_EXPIRE_DAYS, ALGORITHM, JWT_SECRET
+from server.db.schemas import CustomerPublic, Principal, RestaurantWithDetail, UserType
+from server.config import (
+    ACCESS_TOKEN_EXPIRE_DAYS, ALGORITHM, JWT_SECRET,
+    PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL_SECONDS,
+)
 from server.db.session import get_session
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from server.utils.cache import TTLCache
+from server.utils.passwords import password_hasher
 
 # Use mapping dictionaries instead of if-else blocks or ternary operators for cleaner role-based logic
 model_map = {
@@ -25,16 +30,26 @@ schema_map = {
     UserType.restaurant: RestaurantWithDetail,
 }
 
+# Relationships to eager-load for each role's public schema
+options_map = {
+    UserType.customer: customer_public_options,
+    UserType.restaurant: restaurant_detail_options,
+}
+
 
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+async def hash_password(password: str) -> str:
+    return await password_hasher.hash(password)
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await password_hasher.verify(plain_password, hashed_password)
 
 
+# PyJWT is imported on first use, like passlib in utils/passwords.py;
+# after that these imports are dictionary lookups
 def create_access_token(user_id: UUID, role: str) -> str:
+    import jwt
+
     expire = datetime.now() + (timedelta(days=ACCESS_TOKEN_EXPIRE_DAYS))
     to_encode = {
         "sub": str(user_id),
@@ -45,6 +60,9 @@ def create_access_token(user_id: UUID, role: str) -> str:
 
 
 def decode_token(token: str):
+    import jwt
+    from jwt.exceptions import InvalidTokenError
+
     try:
         # Decode JWT token
         payload = jwt.decode(token, JWT_SECRET, algorithms=[ALGORITHM])
@@ -55,40 +73,140 @@ def decode_token(token: str):
         if user_id is None or role is None:
             raise invalid_credentials
 
-        return user_id, role
+        return user_id, role, payload.get("exp")
     except InvalidTokenError:
         raise invalid_credentials
 
 
-async def authenticate_user(
-    request: Request,
-    token: str | None = Cookie(default=None, alias="access_token"),
-    session: Session = Depends(get_session),
-) -> Customer | Restaurant:
-    if not token:
+class PrincipalCache:
+    """
+    Maps verified tokens to principal snapshots, so repeated requests skip
+    the JWT decode and, for principal-only routes, the user lookup as well.
+    Each user has a generation; giving it a new one invalidates every cached
+    token of that user without having to track them.
+
+    A new generation only matters while tokens cached before it can still be
+    in the cache, so it is forgotten once the TTL has passed. Generations
+    come from one counter, so a forgotten one is never handed out again.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._tokens = TTLCache(max_size=max_size, ttl=ttl)
+        # user id -> (generation, when it was given), oldest first
+        self._generations: OrderedDict[UUID, tuple[int, float]] = OrderedDict()
+        self._counter = count(1)
+
+    def _generation(self, user_id: UUID) -> int:
+        entry = self._generations.get(user_id)
+        return 0 if entry is None else entry[0]
+
+    def get(self, token: str) -> Principal | None:
+        entry = self._tokens.get(token)
+        if entry is None:
+            return None
+
+        principal, generation = entry
+        if self._generation(principal.id) != generation:
+            self._tokens.pop(token)
+            return None
+        return principal
+
+    def set(self, token: str, principal: Principal, expires_at: float | None) -> None:
+        # Never keep a token past its own expiry
+        ttl = None if expires_at is None else expires_at - time()
+        if ttl is not None and ttl <= 0:
+            return
+        self._tokens.set(token, (principal, self._generation(principal.id)), ttl=ttl)
+
+    def invalidate_user(self, user_id: UUID) -> None:
+        now = monotonic()
+        while self._generations:
+            oldest, (_, given_at) = next(iter(self._generations.items()))
+            if given_at + self.ttl > now:
+                break
+            del self._generations[oldest]
+
+        self._generations.pop(user_id, None)
+        self._generations[user_id] = (next(self._counter), now)
+        if len(self._generations) > self.max_size:
+            # More users invalidated within a TTL than tracked: start over
+            self.clear()
+
+    def clear(self) -> None:
+        self._tokens.clear()
+        self._generations.clear()
+
+
+principal_cache = PrincipalCache(
+    max_size=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL_SECONDS)
+
+
+async def _load_user(session: AsyncSession, role: str, user_id: UUID) -> Customer | Restaurant:
+    model = model_map.get(role)
+    if model is None:
         raise invalid_credentials
 
-    user_id, role = decode_token(token=token)
+    # Get user from database
+    user = await session.get(model, user_id)
+    if user is None:
+        raise invalid_credentials
 
-    try:
-        # Get user from database
-        user = session.get(model_map.get(role), user_id)
+    return user
 
-        if user is None:
-            raise invalid_credentials
-    except Exception as e:
-        print(e)
+
+async def _resolve_token(token: str | None, session: AsyncSession) -> tuple[Principal, Customer | Restaurant | None]:
+    """
+    Returns the principal behind a token, plus the user object if it had to be loaded.
+    The user is only loaded on a cache miss, to check that it still exists.
+    """
+    if not token:
         raise invalid_credentials
 
+    principal = principal_cache.get(token)
+    if principal is not None:
+        return principal, None
+
+    user_id, role, expires_at = decode_token(token=token)
+    user = await _load_user(session, role, user_id)
+
+    principal = Principal(id=user.id, role=role, username=user.username)
+    principal_cache.set(token, principal, expires_at)
+    return principal, user
+
+
+async def authenticate_user(
+    request: Request,
+    token: str | None = Cookie(default=None, alias="access_token"),
+    session: AsyncSession = Depends(get_session),
+) -> Customer | Restaurant:
+    principal, user = await _resolve_token(token, session)
+    if user is None:
+        user = await _load_user(session, principal.role, principal.id)
     return user
 
 
-def get_user_by_email(session: Session, email: str, model: Customer | Restaurant):
+async def authenticate_principal(
+    request: Request,
+    token: str | None = Cookie(default=None, alias="access_token"),
+    session: AsyncSession = Depends(get_session),
+) -> Principal:
+    """
+    Like `authenticate_user`, but returns only the principal snapshot.
+    Use it on routes that need nothing but the caller's id and role:
+    a cached token is then served without touching the database.
+    """
+    principal, _ = await _resolve_token(token, session)
+    return principal
+
+
+async def get_user_by_email(session: AsyncSession, email: str, model: Customer | Restaurant):
     """
     Retrieve a user from the database using their email and model.
 
     Args:
-        session (Session): SQLModel session for database interaction.
+        session (AsyncSession): SQLModel session for database interaction.
         email (str): Email address of the user to retrieve.
         model (Customer | Restaurant): The model to search (e.g., Customer or Restaurant).
 
@@ -99,7 +217,7 @@ def get_user_by_email(session: Session, email: str, model: Customer | Restaurant
         HTTPException: 404 error if no user is found.
     """
     # Execute a SELECT query to retrieve the user with the specified email.
-    user = session.exec(select(model).where(model.email == email)).first()
+    user = (await session.exec(select(model).where(model.email == email))).first()
 
     # Raise a 404 error if the user is not found in the database.
     if not user:
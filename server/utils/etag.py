@@ -0,0 +1,49 @@
+from datetime import datetime
+from hashlib import blake2b
+from fastapi import Request, Response
+from sqlmodel import update
+from sqlmodel.ext.asyncio.session import AsyncSession
+from uuid import UUID
+
+from server.db.models import Customer, Restaurant
+
+
+def make_etag(*parts) -> str:
+    """Builds a weak ETag from the version markers of the entities a response depends on."""
+    digest = blake2b("|".join(str(p) for p in parts).encode(), digest_size=12)
+    return f'W/"{digest.hexdigest()}"'
+
+
+def not_modified(request: Request, response: Response, etag: str) -> Response | None:
+    """
+    Returns a 304 response if the client already holds the current representation.
+    Otherwise attaches the ETag to the outgoing response and returns None,
+    so the route can go on and build the full body.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        candidates = {tag.strip() for tag in if_none_match.split(",")}
+        # Weak comparison, as required for If-None-Match
+        if "*" in candidates or etag in candidates or etag.removeprefix("W/") in candidates:
+            return Response(status_code=304, headers={"ETag": etag})
+
+    response.headers["ETag"] = etag
+    return None
+
+
+async def bump_restaurant(session: AsyncSession, restaurant_id: UUID, public: bool = False) -> None:
+    """
+    Marks the restaurant's detailed view as changed.
+    Pass `public=True` when the change is also visible in the public catalog.
+    """
+    values = {"version": Restaurant.version + 1}
+    if public:
+        values["updated_at"] = datetime.now()
+    await session.exec(update(Restaurant).where(
+        Restaurant.id == restaurant_id).values(**values))
+
+
+async def bump_customer(session: AsyncSession, customer_id: UUID) -> None:
+    """Marks the customer's profile view as changed."""
+    await session.exec(update(Customer).where(Customer.id ==
+                 customer_id).values(version=Customer.version + 1))
@@ -1,3 +1,4 @@
+from math import ceil
 from fastapi import HTTPException, status
 
 incorrect_email_or_password = HTTPException(
@@ -21,12 +22,79 @@ validation_error = HTTPException(
     detail="Invalid data"
 )
 
+food_not_on_menu = HTTPException(
+    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+    detail="One or more foods are not on this restaurant's menu"
+)
+
 order_not_found = HTTPException(
     status_code=status.HTTP_404_NOT_FOUND,
     detail="Order not found"
 )
 
+restaurant_not_found = HTTPException(
+    status_code=status.HTTP_404_NOT_FOUND,
+    detail="Restaurant not found"
+)
+
+food_not_found = HTTPException(
+    status_code=status.HTTP_404_NOT_FOUND,
+    detail="Food not found on this restaurant's menu"
+)
+
 user_not_found = HTTPException(
     status_code=status.HTTP_404_NOT_FOUND,
     detail="User not found"
 )
+
+invalid_cursor = HTTPException(
+    status_code=status.HTTP_400_BAD_REQUEST,
+    detail="Invalid pagination cursor"
+)
+
+invalid_upload = HTTPException(
+    status_code=status.HTTP_400_BAD_REQUEST,
+    detail="The upload is not a valid JSON array or CSV file"
+)
+
+unsupported_upload_type = HTTPException(
+    status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+    detail="Upload the menu as application/json or text/csv"
+)
+
+upload_too_large = HTTPException(
+    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+    detail="The upload has too many rows"
+)
+
+upload_row_too_large = HTTPException(
+    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+    detail="A row of the upload is too long"
+)
+
+invalid_fields = HTTPException(
+    status_code=status.HTTP_400_BAD_REQUEST,
+    detail="Unknown field requested in `fields`"
+)
+
+password_hasher_busy = HTTPException(
+    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+    detail="Too many sign-in attempts in progress, please try again shortly",
+    headers={"Retry-After": "1"},
+)
+
+
+def too_many_requests(retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Too many requests, please slow down",
+        headers={"Retry-After": str(max(ceil(retry_after), 1))},
+    )
+
+
+def kitchen_at_capacity(retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="This restaurant is not taking more orders right now, please try again later",
+        headers={"Retry-After": str(max(ceil(retry_after), 1))},
+    )
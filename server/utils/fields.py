@@ -0,0 +1,168 @@
+"""
+Sparse fieldsets: `?fields=id,username,orders.status,orders.food.title`.
+
+A projection picks fields of a response schema, nested ones by dotted path.
+It decides both what is serialized and what is loaded: only the relationships
+behind the requested fields get loader options, and the response is built
+from a schema holding just those fields, so nothing else is ever read from
+the instance, let alone lazy loaded.
+"""
+import types
+from copy import copy
+from functools import lru_cache
+from typing import Union, get_args, get_origin
+from fastapi import Query, Response
+from pydantic import BaseModel, ConfigDict, create_model
+from sqlalchemy import inspect
+from sqlalchemy.orm import joinedload, selectinload
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from server.db.loaders import computed_field_relationships, reload
+from server.utils.exceptions import invalid_fields
+from server.utils.responses import model_response
+
+# Requested fields as a hashable tree: (name, children) pairs sorted by name.
+# A field without children is returned whole.
+Fields = tuple[tuple[str, "Fields"], ...]
+
+FIELDS_QUERY = Query(
+    default=None,
+    description="Comma-separated fields to return, nested ones by dotted path, "
+                "e.g. `id,username,orders.status`. All fields when omitted.",
+)
+
+
+def _nested_schema(annotation) -> type[BaseModel] | None:
+    """The model inside `X`, `list[X]` or `X | None`, if any."""
+    if get_origin(annotation) in (list, Union, types.UnionType):
+        return next(filter(None, map(_nested_schema, get_args(annotation))), None)
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return annotation
+    return None
+
+
+def _replace_schema(annotation, old: type, new: type):
+    origin = get_origin(annotation)
+    if origin is list:
+        return list[_replace_schema(get_args(annotation)[0], old, new)]
+    if origin in (Union, types.UnionType):
+        return Union[tuple(_replace_schema(arg, old, new) for arg in get_args(annotation))]
+    return new if annotation is old else annotation
+
+
+def _freeze(tree: dict) -> Fields:
+    return tuple(sorted((name, _freeze(children)) for name, children in tree.items()))
+
+
+def parse_fields(fields: str, schema: type[BaseModel]) -> Fields:
+    """Parses and validates `fields` against the schema; unknown fields are rejected."""
+    tree: dict = {}
+    whole: set[tuple[str, ...]] = set()
+    for path in filter(None, (p.strip() for p in fields.split(","))):
+        names = tuple(path.split("."))
+        node, current = tree, schema
+        for name in names:
+            field = current and current.model_fields.get(name)
+            if not field:
+                raise invalid_fields
+            node = node.setdefault(name, {})
+            current = _nested_schema(field.annotation)
+        whole.add(names)
+
+    if not tree:
+        raise invalid_fields
+
+    # "orders" asks for every field of the orders, even next to "orders.status"
+    for names in whole:
+        node = tree
+        for name in names[:-1]:
+            node = node[name]
+        node[names[-1]] = {}
+    return _freeze(tree)
+
+
+@lru_cache(maxsize=256)
+def projected_schema(schema: type[BaseModel], fields: Fields) -> type[BaseModel]:
+    """A schema with only the requested fields of `schema`, read from attributes."""
+    requested = dict(fields)
+    definitions = {}
+    # In the schema's order, so a projection reads like the full response
+    for name, field in schema.model_fields.items():
+        if name not in requested:
+            continue
+        children = requested[name]
+        annotation = field.annotation
+        nested = _nested_schema(annotation)
+        if nested is not None and children:
+            annotation = _replace_schema(annotation, nested, projected_schema(nested, children))
+        # A copy: pydantic stores the new annotation on the FieldInfo it is given
+        definitions[name] = (annotation, copy(field))
+    return create_model(
+        f"{schema.__name__}Fields",
+        __config__=ConfigDict(from_attributes=True),
+        **definitions,
+    )
+
+
+def load_options(model: type[SQLModel], schema: type[BaseModel], fields: Fields) -> list:
+    """Loader options for the relationships behind the requested fields, and nothing else."""
+    relationships = inspect(model).relationships
+    wanted = dict(fields)
+    # Fields computed from a relationship the schema does not list
+    for name in list(wanted):
+        for relationship in computed_field_relationships.get(model, {}).get(name, ()):
+            wanted.setdefault(relationship, ())
+
+    options = []
+    for name, children in wanted.items():
+        if name not in relationships:
+            continue
+        relationship = relationships[name]
+        attribute = getattr(model, name)
+        loader = selectinload(attribute) if relationship.uselist else joinedload(attribute)
+
+        nested = name in schema.model_fields and _nested_schema(schema.model_fields[name].annotation)
+        if nested:
+            nested_options = load_options(relationship.mapper.class_, nested,
+                                          children or all_fields(nested))
+            if nested_options:
+                loader = loader.options(*nested_options)
+        options.append(loader)
+    return options
+
+
+@lru_cache(maxsize=64)
+def all_fields(schema: type[BaseModel]) -> Fields:
+    return _freeze({name: {} for name in schema.model_fields})
+
+
+class Projection:
+    """The fields of `schema` a request asked for; all of them when `fields` is None."""
+
+    def __init__(self, schema: type[BaseModel], fields: str | None):
+        self.schema = schema
+        self.fields = None if fields is None else parse_fields(fields, schema)
+        self.response_schema = schema if self.fields is None else projected_schema(schema, self.fields)
+
+    @property
+    def key(self) -> str:
+        """Identifies the projection, e.g. in an ETag."""
+        return "*" if self.fields is None else repr(self.fields)
+
+    def covered_by(self, schema: type[BaseModel]) -> bool:
+        """Whether an instance of `schema` already holds every requested field, whole."""
+        return self.fields is not None and all(
+            not children and name in schema.model_fields for name, children in self.fields)
+
+    def options(self, model: type[SQLModel], full_options: list) -> list:
+        """Loader options for the projection; `full_options` serve the whole schema."""
+        return full_options if self.fields is None else load_options(model, self.schema, self.fields)
+
+    async def load(self, session: AsyncSession, instance: SQLModel, full_options: list) -> SQLModel:
+        """Loads the relationships the projection needs onto an instance whose columns are loaded."""
+        options = self.options(type(instance), full_options)
+        return await reload(session, instance, options) if options else instance
+
+    def response(self, instance, response: Response | None = None) -> Response:
+        return model_response(self.response_schema.model_validate(instance), response)
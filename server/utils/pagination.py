@@ -0,0 +1,102 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+from fastapi import Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import tuple_
+from sqlmodel import Session, SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+from uuid import UUID
+
+from server.config import STREAM_BATCH_SIZE
+from server.db.session import async_read_engine, read_engine
+from server.utils.exceptions import invalid_cursor
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(created_at: datetime, id: UUID) -> str:
+    """Encodes the sort key of the last row of a page into an opaque cursor."""
+    raw = f"{created_at.isoformat()}|{id}"
+    return urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, UUID]:
+    try:
+        created_at, id = urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), UUID(id)
+    except ValueError:
+        raise invalid_cursor
+
+
+def keyset(query, model: type[SQLModel], cursor: str | None, limit: int | None,
+           newest_first: bool = False):
+    """
+    Orders the query by (created_at, id) and starts it right after the cursor.
+    One extra row is fetched so `next_cursor` can tell whether another page exists.
+    """
+    key = tuple_(model.created_at, model.id)
+    if newest_first:
+        query = query.order_by(model.created_at.desc(), model.id.desc())
+    else:
+        query = query.order_by(model.created_at, model.id)
+    if cursor:
+        created_at, id = decode_cursor(cursor)
+        after = tuple_(created_at, id)
+        query = query.where(key < after if newest_first else key > after)
+    if limit is not None:
+        query = query.limit(limit + 1)
+    return query
+
+
+def next_cursor(rows: list, limit: int | None, response: Response) -> list:
+    """
+    Trims the look-ahead row and exposes the cursor of the next page
+    in the `X-Next-Cursor` header. The header is absent on the last page.
+    """
+    if limit is None or len(rows) <= limit:
+        return rows
+
+    rows = rows[:limit]
+    last = rows[-1]
+    response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last.created_at, last.id)
+    return rows
+
+
+def _encode_batch(batch, schema: type[SQLModel]) -> str:
+    return ",".join(schema.model_validate(row).model_dump_json() for row in batch)
+
+
+def stream_json_array(query, schema: type[SQLModel], headers: dict | None = None) -> StreamingResponse:
+    """
+    Writes the rows of the query as a JSON array while they are being fetched.
+    Rows are read `STREAM_BATCH_SIZE` at a time and dropped from the session
+    after being written, so memory stays flat however many rows there are.
+    The route's injected `Response` is not sent, so headers such as an ETag
+    must be passed in `headers`.
+    """
+    query = query.execution_options(yield_per=STREAM_BATCH_SIZE)
+
+    # The request's session is closed before the body is sent, so use a dedicated one
+    async def generate_async():
+        async with AsyncSession(async_read_engine) as session:
+            result = await session.stream_scalars(query)
+            separator = "["
+            async for batch in result.partitions():
+                yield separator + _encode_batch(batch, schema)
+                separator = ","
+                session.expunge_all()
+            yield "]" if separator == "," else "[]"
+
+    # Iterated in the threadpool by StreamingResponse
+    def generate_sync():
+        with Session(read_engine) as session:
+            result = session.exec(query)
+            separator = "["
+            for batch in result.partitions():
+                yield separator + _encode_batch(batch, schema)
+                separator = ","
+                session.expunge_all()
+            yield "]" if separator == "," else "[]"
+
+    generate = generate_sync if async_read_engine is None else generate_async
+    return StreamingResponse(generate(), media_type="application/json", headers=headers)
@@ -0,0 +1,90 @@
+import asyncio
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import cache
+from threading import Lock
+from starlette.concurrency import run_in_threadpool
+
+from server.config import BCRYPT_ROUNDS, PASSWORD_HASH_MAX_PENDING, PASSWORD_HASH_WORKERS
+from server.utils.exceptions import password_hasher_busy
+
+
+@cache
+def pwd_context():
+    # passlib and bcrypt are imported on first use, so a new worker starts
+    # accepting requests before it has to load them
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+
+# Module-level so they can be pickled into the worker processes
+def _hash(password: str) -> str:
+    return pwd_context().hash(password)
+
+
+def _verify(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context().verify(plain_password, hashed_password)
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt in a small pool of worker processes, so a burst of sign-ins
+    neither holds the GIL nor fills the threadpool shared by every other route.
+    Jobs beyond `max_pending` are rejected with 503 instead of queueing forever.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._pending = 0
+        self._lock = Lock()
+        self._pool: ProcessPoolExecutor | None = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        # Created on first use so importing the app does not start processes.
+        # "spawn" avoids forking a process that already runs threads.
+        if self._pool is None:
+            from multiprocessing import get_context
+
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=get_context("spawn"))
+        return self._pool
+
+    def _release(self, _: Future) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    def submit(self, fn, *args) -> Future:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise password_hasher_busy
+            self._pending += 1
+
+        future = self._get_pool().submit(fn, *args)
+        future.add_done_callback(self._release)
+        return future
+
+    async def run(self, fn, *args):
+        if self.workers == 0:
+            return await run_in_threadpool(fn, *args)
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+    async def hash(self, password: str) -> str:
+        return await self.run(_hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self.run(_verify, plain_password, hashed_password)
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+
+password_hasher = PasswordHasher(
+    workers=PASSWORD_HASH_WORKERS, max_pending=PASSWORD_HASH_MAX_PENDING)
+
+
+def needs_rehash(hashed_password: str) -> bool:
+    """True if the hash was made with another bcrypt cost than the configured one."""
+    return pwd_context().needs_update(hashed_password)
@@ -0,0 +1,23 @@
+from fastapi import Response
+from pydantic import BaseModel
+
+
+def model_response(content: BaseModel, response: Response | None = None,
+                   schema: type[BaseModel] | None = None) -> Response:
+    """
+    Serializes an already validated model straight to JSON bytes.
+
+    A route returning this skips FastAPI's second pass over the result, where it
+    validates it against `response_model` and serializes it again, so only pass
+    an instance of the route's response model. If it is an instance of a
+    subclass, pass the response model as `schema` to serialize only its fields.
+    Headers set on the route's injected `response`, such as cookies or the
+    ETag, are carried over.
+    """
+    serializer = (schema or type(content)).__pydantic_serializer__
+    fast = Response(serializer.to_json(content), media_type="application/json")
+    if response is not None:
+        fast.raw_headers.extend(
+            (name, value) for name, value in response.raw_headers
+            if name not in (b"content-length", b"content-type"))
+    return fast
@@ -0,0 +1,43 @@
+import asyncio
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+from server.config import ORDER_STREAM_HEARTBEAT_SECONDS
+from server.services.events import Subscription
+
+
+def format_event(data: str, event: str = "order") -> str:
+    """Formats a single Server-Sent Event frame."""
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+async def _stream(request: Request, subscription: Subscription, initial: list[str]):
+    with subscription:
+        for data in initial:
+            yield format_event(data)
+
+        while not await request.is_disconnected():
+            try:
+                data = await asyncio.wait_for(
+                    subscription.get(), timeout=ORDER_STREAM_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                # SSE comment line; keeps proxies from closing an idle connection
+                yield ": ping\n\n"
+                continue
+            yield format_event(data)
+
+
+def event_stream_response(
+    request: Request,
+    subscription: Subscription,
+    initial: list[str] | None = None,
+) -> StreamingResponse:
+    """
+    Streams the events of a subscription to the client as Server-Sent Events.
+    `initial` frames are sent first, e.g. the current state of the watched order.
+    """
+    return StreamingResponse(
+        _stream(request, subscription, initial or []),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
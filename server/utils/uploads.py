@@ -0,0 +1,129 @@
+"""
+Incremental parsing of uploaded request bodies.
+
+Both parsers take the body as the chunks `Request.stream()` yields and hand
+out one record at a time as soon as it is complete, so only the record
+being read is held in memory, never the whole upload. A record longer than
+`max_length` characters raises `upload_row_too_large`, whether it is
+complete or still being received.
+"""
+import codecs
+import csv
+import json
+from typing import AsyncIterator
+
+from server.utils.exceptions import invalid_upload, upload_row_too_large
+
+_whitespace = " \t\r\n"
+
+
+async def iter_json_array(chunks: AsyncIterator[bytes], max_length: int) -> AsyncIterator[object]:
+    """Yields the items of a JSON array one by one; a malformed body raises `invalid_upload`."""
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer, state = "", "start"
+
+    def items(final: bool) -> list:
+        """Takes the complete items off the front of the buffer."""
+        nonlocal buffer, state
+        pos, found = 0, []
+        while True:
+            while pos < len(buffer) and buffer[pos] in _whitespace:
+                pos += 1
+            if pos == len(buffer):
+                break
+            char = buffer[pos]
+            if state == "start" and char == "[":
+                pos, state = pos + 1, "first"
+            elif state in ("first", "next") and char == "]":
+                pos, state = pos + 1, "end"
+            elif state == "next" and char == ",":
+                pos, state = pos + 1, "item"
+            elif state in ("first", "item"):
+                try:
+                    item, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if final:
+                        raise invalid_upload
+                    break
+                # A number at the end of the buffer may go on in the next chunk
+                if end == len(buffer) and not final:
+                    break
+                if end - pos > max_length:
+                    raise upload_row_too_large
+                found.append(item)
+                pos, state = end, "next"
+            else:
+                raise invalid_upload
+        buffer = buffer[pos:]
+        # What is left is the start of an item that is not complete yet
+        if len(buffer) > max_length:
+            raise upload_row_too_large
+        return found
+
+    try:
+        async for chunk in chunks:
+            buffer += text.decode(chunk)
+            for item in items(final=False):
+                yield item
+        buffer += text.decode(b"", final=True)
+    except UnicodeDecodeError:
+        raise invalid_upload
+    for item in items(final=True):
+        yield item
+    if state != "end":
+        raise invalid_upload
+
+
+def _split_records(text: str) -> tuple[list[str], str]:
+    """Splits off the complete CSV records of `text`; a line break inside quotes does not end one."""
+    records, record = [], ""
+    for line in text.splitlines(keepends=True):
+        record += line
+        # Quotes inside a field are doubled, so an odd count means a field is still open
+        if line.endswith(("\n", "\r")) and record.count('"') % 2 == 0:
+            records.append(record)
+            record = ""
+    return records, record
+
+
+async def iter_csv_records(chunks: AsyncIterator[bytes], max_length: int) -> AsyncIterator[dict]:
+    """
+    Yields the records of a CSV file with a header row as dicts, like
+    `csv.DictReader`: values beyond the header are listed under `None`.
+    Empty cells and missing values are left out.
+    """
+    text = codecs.getincrementaldecoder("utf-8-sig")()
+    pending, header = "", None
+
+    def records(complete: list[str]):
+        nonlocal header
+        if any(len(record) > max_length for record in complete):
+            raise upload_row_too_large
+        try:
+            for values in csv.reader(complete, strict=True):
+                if not any(values):
+                    continue
+                if header is None:
+                    header = [name.strip().lower() for name in values]
+                    continue
+                record = {name: value for name, value in zip(header, values) if value != ""}
+                if len(values) > len(header):
+                    record[None] = values[len(header):]
+                yield record
+        except csv.Error:
+            raise invalid_upload
+
+    try:
+        async for chunk in chunks:
+            complete, pending = _split_records(pending + text.decode(chunk))
+            for record in records(complete):
+                yield record
+            if len(pending) > max_length:
+                raise upload_row_too_large
+        pending += text.decode(b"", final=True)
+    except UnicodeDecodeError:
+        raise invalid_upload
+    # The last record may lack a line break, but not a closing quote
+    for record in records([pending] if pending else []):
+        yield record